@@ -0,0 +1,82 @@
+import datetime
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from account.models import Interest, User
+from api import renderers
+from api.renderers import FastJSONRenderer
+from api.serializers import ProjectReadOnlySerializer
+from checkpoints.models import Checkpoint
+from participants.models import Participant
+from projects.models import Project, Rating
+
+N_INTERESTS = 20
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость JSON-рендереров на ответе списка проектов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projects', type=int, default=1000, help='Число проектов в ответе')
+        parser.add_argument('--repeat', type=int, default=20, help='Число повторов рендеринга')
+        parser.add_argument('--output', help='Файл для результатов в формате JSON (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        if options['projects'] < 1 or options['repeat'] < 1:
+            raise CommandError('Параметры должны быть положительными')
+        with transaction.atomic():
+            user = _generate(options['projects'])
+            request = APIRequestFactory().get('/api/projects/')
+            request.user = user
+            data = ProjectReadOnlySerializer(Project.objects.with_stats(user.pk), many=True,
+                                             context={'request': request}).data
+            transaction.set_rollback(True)
+        results = {}
+        for name, renderer in [('json', JSONRenderer()), ('fast', FastJSONRenderer())]:
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                content = renderer.render(data)
+                timings.append(time.perf_counter() - start)
+            results[name] = {'best_seconds': min(timings), 'mean_seconds': sum(timings) / len(timings),
+                             'bytes': len(content)}
+        if json.loads(JSONRenderer().render(data)) != json.loads(FastJSONRenderer().render(data)):
+            raise CommandError('Рендереры вернули разные данные')
+        report = json.dumps({
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'orjson': renderers.orjson is not None,
+            'projects': options['projects'],
+            'repeat': options['repeat'],
+            'results': results,
+            'speedup': results['json']['best_seconds'] / results['fast']['best_seconds'],
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(report)
+
+
+def _generate(n_projects):
+    interests = Interest.objects.bulk_create([Interest(title=f'benchmark-{i}') for i in range(N_INTERESTS)])
+    user = User.objects.create_user(email='benchmark-renderers@example.com')
+    today = datetime.date.today()
+    projects = Project.objects.bulk_create(
+        [Project(title=f'Benchmark {i}', description='Описание проекта ' * 10, creator=user,
+                 application_deadline=today + datetime.timedelta(days=30),
+                 completion_deadline=today + datetime.timedelta(days=90)) for i in range(n_projects)])
+    Project.tags.through.objects.bulk_create(
+        [Project.tags.through(project_id=project.pk, interest_id=interests[(i + j) % N_INTERESTS].pk)
+         for i, project in enumerate(projects) for j in range(3)])
+    Participant.objects.bulk_create([Participant(title='Role', description='', project=project)
+                                     for project in projects])
+    Checkpoint.objects.bulk_create([Checkpoint(title='Checkpoint', description='', project=project,
+                                               deadline=today + datetime.timedelta(days=60)) for project in projects])
+    Rating.objects.bulk_create([Rating(user=user, project=project, rating=i % 6) for i, project in enumerate(projects)])
+    return user
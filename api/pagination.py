@@ -1,7 +1,45 @@
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
+from studentProjects.pagination import KeysetPaginator
 
-class ProjectPagination(PageNumberPagination):
+
+class KeysetPaginationMixin:
+    cursor_query_param = 'cursor'
+    keyset_page = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_page = None
+        if self.cursor_query_param not in request.query_params or queryset.query.is_sliced:
+            return super().paginate_queryset(queryset, request, view)
+        paginator = KeysetPaginator(queryset, self.get_page_size(request))
+        try:
+            self.keyset_page = paginator.page(request.query_params[self.cursor_query_param])
+        except InvalidPage as e:
+            raise NotFound(str(e))
+        self.request = request
+        return list(self.keyset_page)
+
+    def get_paginated_response(self, data):
+        if self.keyset_page is None:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self._get_cursor_link(self.keyset_page.next_cursor),
+            'previous': self._get_cursor_link(self.keyset_page.previous_cursor),
+            'results': data,
+        })
+
+    def _get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+class ProjectPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 5
 
     def paginate_queryset(self, queryset, request, view=None):
@@ -10,10 +48,28 @@ class ProjectPagination(PageNumberPagination):
         return super().paginate_queryset(queryset, request, view)
 
 
-class CheckpointPagination(PageNumberPagination):
+class CheckpointPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 5
 
     def paginate_queryset(self, queryset, request, view=None):
         if view.action != 'mine':
             return None
         return super().paginate_queryset(queryset, request, view)
+
+
+class ApplicationPagination(PageNumberPagination):
+    page_size = 5
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if view.action not in ['mine', 'applications']:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class NotificationPagination(KeysetPaginationMixin, PageNumberPagination):
+    page_size = 5
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if view.action != 'mine' or self.cursor_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
@@ -13,7 +13,7 @@ class UserPermission(BasePermission):
 
 class ProjectPermission(BasePermission):
     def has_object_permission(self, request, view, obj):
-        if view.action in ['retrieve', 'checkpoints', 'participants', 'rate']:
+        if view.action in ['retrieve', 'checkpoints', 'participants', 'rate', 'similar']:
             return request.user.is_authenticated
         return request.user.is_authenticated and obj.creator == request.user
 
@@ -35,7 +35,7 @@ class ApplicationPermission(BasePermission):
 class ParticipantPermission(BasePermission):
     def has_object_permission(self, request, view, obj):
         check = request.user.is_authenticated
-        if view.action in ['update', 'partial_update', 'applications']:
+        if view.action in ['update', 'partial_update', 'applications', 'candidates']:
             return check and obj.project.creator == request.user
         if view.action == 'clear':
             return check and (obj.participant == request.user or obj.project.creator == request.user)
@@ -3,9 +3,10 @@ import datetime
 from django.contrib.auth import password_validation
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
-from rest_framework.fields import SerializerMethodField, CharField, FileField
+from rest_framework.fields import SerializerMethodField, CharField, FileField, FloatField, IntegerField
 
 from account.models import Interest, User
+from api.utils import get_memberships
 from applications.models import Application
 from checkpoints.models import Checkpoint
 from notifications.models import Notification
@@ -13,6 +14,16 @@ from participants.models import Participant
 from projects.models import Project, Rating
 
 
+BULK_MAX_SIZE = 100
+
+
+class IdListSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=IntegerField(), allow_empty=False, max_length=BULK_MAX_SIZE)
+
+    def validate_ids(self, value):
+        return sorted(set(value))
+
+
 class InterestSerializer(serializers.ModelSerializer):
     class Meta:
         model = Interest
@@ -27,6 +38,13 @@ class UserInfoSerializer(serializers.ModelSerializer):
         fields = ['id', 'full_name', 'description', 'email', 'phone', 'cv', 'interests', 'avatar']
 
 
+class CandidateSerializer(UserInfoSerializer):
+    match_score = FloatField(read_only=True)
+
+    class Meta(UserInfoSerializer.Meta):
+        fields = UserInfoSerializer.Meta.fields + ['match_score']
+
+
 class UserUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -78,56 +96,51 @@ class ParticipantSerializer(serializers.ModelSerializer):
         read_only_fields = ['project']
 
     def get_participant(self, obj):
-        participants_and_creator = set(x.participant for x in obj.project.participants.all())
-        participants_and_creator.add(obj.project.creator)
-        if self.context['request'].user in participants_and_creator:
-            if obj.participant is None:
-                return None
-            return obj.participant.pk
-        if obj.participant is None:
+        if get_memberships(self.context).is_member(obj.project_id):
+            return obj.participant_id
+        if obj.participant_id is None:
             return 'Нет участника'
         return 'Есть участник'
 
 
-class ProjectReadOnlySerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    expandable_fields = {
+        'checkpoints': CheckpointReadOnlySerializer,
+        'participants': ParticipantSerializer,
+    }
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = self.context.get('expand', ())
+        for name in expand:
+            fields[name] = self.expandable_fields[name](many=True, read_only=True)
+        requested = self.context.get('fields')
+        if requested is not None:
+            fields = {name: field for name, field in fields.items() if name in requested or name in expand}
+        return fields
+
+
+class ProjectReadOnlySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tags = InterestSerializer(many=True, read_only=True)
-    vacancies_num = SerializerMethodField()
-    checkpoints_num = SerializerMethodField()
-    participants_num = SerializerMethodField()
-    mean_rating = SerializerMethodField()
-    my_rating = SerializerMethodField()
+    vacancies_num = IntegerField(read_only=True)
+    checkpoints_num = IntegerField(read_only=True)
+    participants_num = IntegerField(read_only=True)
+    mean_rating = FloatField(read_only=True)
+    my_rating = IntegerField(read_only=True)
 
     class Meta:
         model = Project
         fields = ['id', 'title', 'creator', 'created', 'description', 'application_deadline', 'completion_deadline',
                   'status', 'tags', 'checkpoints_num', 'participants_num', 'vacancies_num', 'mean_rating', 'my_rating']
 
-    def get_vacancies_num(self, obj):
-        return obj.participants.filter(participant=None).count()
-
-    def get_checkpoints_num(self, obj):
-        return obj.checkpoints.count()
-
-    def get_participants_num(self, obj):
-        return obj.participants.count()
-
-    def get_mean_rating(self, obj):
-        return obj.mean_rating()
 
-    def get_my_rating(self, obj):
-        rating = obj.ratings.filter(user=self.context['request'].user)
-        if rating.exists():
-            return rating.first().rating
-        return None
-
-
-class ProjectRecommendedSerializer(serializers.ModelSerializer):
+class ProjectRecommendedSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tags = InterestSerializer(many=True, read_only=True)
-    vacancies_num = SerializerMethodField()
-    checkpoints_num = SerializerMethodField()
-    participants_num = SerializerMethodField()
-    mean_rating = SerializerMethodField()
-    expected_rating = SerializerMethodField()
+    vacancies_num = IntegerField(read_only=True)
+    checkpoints_num = IntegerField(read_only=True)
+    participants_num = IntegerField(read_only=True)
+    mean_rating = FloatField(read_only=True)
+    expected_rating = FloatField(read_only=True)
 
     class Meta:
         model = Project
@@ -135,21 +148,6 @@ class ProjectRecommendedSerializer(serializers.ModelSerializer):
                   'status', 'tags', 'checkpoints_num', 'participants_num', 'vacancies_num',
                   'mean_rating', 'expected_rating']
 
-    def get_vacancies_num(self, obj):
-        return obj.number_of_vacancies
-
-    def get_checkpoints_num(self, obj):
-        return obj.checkpoints.count()
-
-    def get_participants_num(self, obj):
-        return obj.participants.count()
-
-    def get_mean_rating(self, obj):
-        return obj.mean_rating()
-
-    def get_expected_rating(self, obj):
-        return obj.expected_rating
-
 
 class ProjectCreateSerializer(serializers.ModelSerializer):
     checkpoints = CheckpointCreateSerializer(many=True)
@@ -271,6 +269,22 @@ class RatingWriteOnlySerializer(serializers.Serializer):
     rating = serializers.IntegerField(min_value=0, max_value=5, allow_null=True)
 
 
+class RatingItemSerializer(RatingWriteOnlySerializer):
+    project = serializers.IntegerField()
+
+
+class BulkRatingSerializer(serializers.Serializer):
+    ratings = RatingItemSerializer(many=True, allow_empty=False, max_length=BULK_MAX_SIZE)
+
+    def validate_ratings(self, value):
+        project_ids = [item['project'] for item in value]
+        if len(set(project_ids)) != len(project_ids):
+            raise serializers.ValidationError('Проекты не должны повторяться')
+        if Project.objects.filter(pk__in=project_ids).count() != len(project_ids):
+            raise serializers.ValidationError('Проект не найден')
+        return value
+
+
 class RatingReadOnlySerializer(serializers.ModelSerializer):
     class Meta:
         model = Rating
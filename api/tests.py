@@ -1,16 +1,24 @@
 import datetime
+import io
+import json
 from unittest.mock import patch
 
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
 from account.models import User, Interest
+from api.renderers import FastJSONRenderer
 from applications.models import Application
 from checkpoints.models import Checkpoint
 from notifications.models import Notification
 from participants.models import Participant
-from projects.models import Project, Rating
+from projects.models import Project, Rating, RatingsVersion
+from studentProjects.pagination import encode_cursor
 
 
 class UserApiTestCase(TestCase):
@@ -265,6 +273,72 @@ class ProjectApiTestCase(TestCase):
         self.assertIn('results', data)
         self.client.credentials()
 
+    def test_api_projects_list_cursor(self):
+        self.set_credentials(self.user1)
+        projects = [Project.objects.create(**self.project_info) for i in range(7)]
+        response = self.client.get('/api/projects/', {'cursor': '', 'ordering': '-Количество вакансий'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.json())
+        self.assertIsNone(response.json()['previous'])
+        ids = [x['id'] for x in response.json()['results']]
+        while response.json()['next']:
+            response = self.client.get(response.json()['next'], format='json')
+            ids += [x['id'] for x in response.json()['results']]
+        self.assertEqual(sorted((x.id for x in projects), reverse=True), ids)
+        last_page = len(response.json()['results'])
+        response = self.client.get(response.json()['previous'], format='json')
+        self.assertEqual(ids[-last_page - 5:-last_page], [x['id'] for x in response.json()['results']])
+        response = self.client.get('/api/projects/?cursor=invalid', format='json')
+        self.assertEqual(response.status_code, 404)
+        self.client.credentials()
+        for project in projects:
+            project.delete()
+
+    def test_api_projects_list_sparse_fields(self):
+        self.set_credentials(self.user1)
+        project = Project.objects.create(**self.project_info)
+        project.tags.add(self.interest1)
+        Rating.objects.create(user=self.user1, project=project, rating=3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/projects/', {'fields': 'id,title', 'ordering': '-Количество вакансий'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([{'id': project.id, 'title': 'Title1'}], response.json()['results'])
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('projects_rating', sql)
+        self.assertNotIn('projects_project_tags', sql)
+        response = self.client.get('/api/projects/', {'fields': 'id,title', 'cursor': '',
+                                                      'ordering': '-Количество вакансий'})
+        self.assertEqual([{'id': project.id, 'title': 'Title1'}], response.json()['results'])
+        response = self.client.get(f'/api/projects/{project.pk}/', {'fields': 'my_rating'})
+        self.assertEqual({'my_rating': 3}, response.json())
+        self.client.credentials()
+        project.delete()
+
+    def test_api_projects_list_expand(self):
+        self.set_credentials(self.user1)
+        projects = []
+        query_counts = []
+        for i in range(3):
+            project = Project.objects.create(**self.project_info)
+            participant = Participant.objects.create(**self.participant_info, project=project)
+            checkpoint = Checkpoint.objects.create(title='Title', description='Desc', project=project,
+                                                   deadline=datetime.date.today())
+            projects.append(project)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/projects/', {'fields': 'id', 'expand': 'checkpoints,participants'})
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[:1] * 3, query_counts)
+        result = response.json()['results'][-1]
+        self.assertEqual(project.id, result['id'])
+        self.assertEqual([checkpoint.id], [x['id'] for x in result['checkpoints']])
+        self.assertEqual([{'id': participant.id, 'project': project.id, 'title': 'Role1', 'description': 'Role1Desc',
+                           'participant': None}], result['participants'])
+        response = self.client.get('/api/projects/', {'expand': 'ratings'})
+        self.assertEqual(response.status_code, 400)
+        self.client.credentials()
+        for project in projects:
+            project.delete()
+
     def test_api_projects_list_unauthorized(self):
         response = self.client.get('/api/projects/', format='json')
         self.assertEqual(response.status_code, 401)
@@ -327,6 +401,42 @@ class ProjectApiTestCase(TestCase):
         project.delete()
         self.client.credentials()
 
+    def test_api_bulk_rate_projects(self):
+        self.set_credentials(self.user1)
+        projects = [Project.objects.create(**self.project_info) for i in range(3)]
+        rating = Rating.objects.create(user=self.user1, project=projects[0], rating=4)
+        Rating.objects.create(user=self.user1, project=projects[1], rating=4)
+        Rating.objects.create(user=self.user2, project=projects[0], rating=1)
+        version = RatingsVersion.current()
+        data = {'ratings': [{'project': projects[0].pk, 'rating': 2}, {'project': projects[1].pk, 'rating': None},
+                            {'project': projects[2].pk, 'rating': 5}]}
+        with patch('projects.utils.update_user_recommendations') as update, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/projects/bulk_rate/', data=data, format='json')
+        self.assertEqual(response.status_code, 200)
+        update.assert_called_once_with(self.user1.pk)
+        self.assertEqual(version + 1, RatingsVersion.current())
+        self.assertEqual([(projects[0].pk, 2), (projects[2].pk, 5)],
+                         [(x['project'], x['rating']) for x in response.json()])
+        self.assertEqual(rating.pk, response.json()[0]['id'])
+        self.assertEqual({projects[0].pk: 2, projects[2].pk: 5},
+                         dict(self.user1.ratings.values_list('project', 'rating')))
+        self.assertEqual(1, self.user2.ratings.get().rating)
+        data = {'ratings': [{'project': projects[0].pk, 'rating': 3}, {'project': 0, 'rating': 3}]}
+        response = self.client.post('/api/projects/bulk_rate/', data=data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(2, self.user1.ratings.get(project=projects[0]).rating)
+        data = {'ratings': [{'project': projects[1].pk, 'rating': None}]}
+        with patch('projects.utils.update_user_recommendations') as update, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/projects/bulk_rate/', data=data, format='json')
+        self.assertEqual(response.status_code, 200)
+        update.assert_not_called()
+        self.assertEqual(version + 1, RatingsVersion.current())
+        for project in projects:
+            project.delete()
+        self.client.credentials()
+
     def test_api_rate_project_unauthorized(self):
         project = Project.objects.create(**self.project_info)
         response = self.client.post(f'/api/projects/{project.pk}/rate/', format='json')
@@ -343,6 +453,33 @@ class ProjectApiTestCase(TestCase):
         project.delete()
         self.client.credentials()
 
+    def test_api_projects_list_query_count(self):
+        self.set_credentials(self.user1)
+        projects = []
+        query_counts = []
+        for i in range(3):
+            project = Project.objects.create(**self.project_info)
+            project.tags.add(self.interest1, self.interest2)
+            Participant.objects.create(**self.participant_info, project=project)
+            Participant.objects.create(**self.participant_info, project=project, participant=self.user2)
+            Checkpoint.objects.create(title='Title', description='Desc', project=project,
+                                      deadline=datetime.date.today())
+            Rating.objects.create(user=self.user1, project=project, rating=i + 2)
+            Rating.objects.create(user=self.user2, project=project, rating=4)
+            projects.append(project)
+            for url in ['/api/projects/', '/api/projects/mine/', '/api/projects/rated/']:
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(200, self.client.get(url, format='json').status_code)
+                query_counts.append((url, len(queries)))
+        self.assertEqual(query_counts[:3] * 3, query_counts)
+        data = self.client.get(f'/api/projects/{projects[0].pk}/', format='json').json()
+        self.assertEqual((1, 1, 2, 3.0, 2), (data['vacancies_num'], data['checkpoints_num'], data['participants_num'],
+                                             data['mean_rating'], data['my_rating']))
+        self.assertEqual(2, len(data['tags']))
+        for project in projects:
+            project.delete()
+        self.client.credentials()
+
     def test_api_projects_involved_unauthorized(self):
         response = self.client.get('/api/projects/involved/', format='json')
         self.assertEqual(response.status_code, 401)
@@ -405,6 +542,27 @@ class ProjectApiTestCase(TestCase):
         self.client.credentials()
         project.delete()
 
+    def test_api_project_participants_query_count(self):
+        project = Project.objects.create(**self.project_info)
+        Participant.objects.create(**self.participant_info, project=project, participant=self.user2)
+        query_counts = []
+        for i in range(3):
+            Participant.objects.create(**self.participant_info, project=project)
+            for user in [self.user1, self.user2]:
+                self.set_credentials(user)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(f'/api/projects/{project.pk}/participants/', format='json')
+                query_counts.append(len(queries))
+        self.assertEqual(query_counts[:2] * 3, query_counts)
+        self.assertEqual([self.user2.pk, None, None, None], [x['participant'] for x in response.json()])
+        other = User.objects.create_user(email='other@bk.ru')
+        self.set_credentials(other)
+        response = self.client.get(f'/api/projects/{project.pk}/participants/', format='json')
+        self.assertEqual(['Есть участник'] + ['Нет участника'] * 3, [x['participant'] for x in response.json()])
+        self.client.credentials()
+        other.delete()
+        project.delete()
+
     def test_api_project_participants_unauthorized(self):
         project = Project.objects.create(**self.project_info)
         response = self.client.get(f'/api/projects/{project.pk}/participants/', format='json')
@@ -836,9 +994,32 @@ class ParticipantApiTestCase(TestCase):
                                    'phone': None,
                                    'cv': None, 'interests': [{'id': self.interest1.id, 'title': 'Math'}],
                                    'avatar': None}}]
-        self.assertEqual(expected, response.json())
+        self.assertEqual(expected, response.json()['results'])
+        self.client.credentials()
+        project.delete()
+
+    def test_api_participant_applications_query_count(self):
+        self.set_credentials(self.user1)
+        project = Project.objects.create(**self.project_info)
+        participant = Participant.objects.create(title='Part1', description='PartDesc1', project=project)
+        applicants = []
+        query_counts = []
+        for i in range(3):
+            applicant = User.objects.create_user(email=f'applicant{i}@bk.ru')
+            applicant.interests.add(self.interest1, self.interest2)
+            applicants.append(applicant)
+            Application.objects.create(vacancy=participant, applicant=applicant)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/api/participants/{participant.id}/applications/', format='json')
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[:1] * 3, query_counts)
+        self.assertEqual(3, response.json()['count'])
+        self.assertEqual([[self.interest1.id, self.interest2.id]] * 3,
+                         [sorted(x['id'] for x in a['applicant']['interests']) for a in response.json()['results']])
         self.client.credentials()
         project.delete()
+        for applicant in applicants:
+            applicant.delete()
 
     def test_api_participant_applications_unauthorized(self):
         project = Project.objects.create(**self.project_info)
@@ -907,7 +1088,26 @@ class ApplicationApiTestCase(TestCase):
                                    'phone': None,
                                    'cv': None, 'interests': [{'id': self.interest1.id, 'title': 'Math'}],
                                    'avatar': None}}]
-        self.assertEqual(expected, response.json())
+        self.assertEqual(expected, response.json()['results'])
+        self.client.credentials()
+        project.delete()
+
+    def test_api_applications_mine_paginated(self):
+        self.set_credentials(self.user1)
+        project = Project.objects.create(**self.project_info)
+        participants = [Participant.objects.create(title=f'Part{i}', description='PartDesc', project=project)
+                        for i in range(7)]
+        applications = [Application.objects.create(vacancy=participant, applicant=self.user1)
+                        for participant in participants]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/applications/mine/', format='json')
+        first_page_queries = len(queries)
+        self.assertEqual(7, response.json()['count'])
+        self.assertEqual([x.id for x in applications[:5]], [x['id'] for x in response.json()['results']])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/applications/mine/?page=2', format='json')
+        self.assertEqual(first_page_queries, len(queries))
+        self.assertEqual([x.id for x in applications[5:]], [x['id'] for x in response.json()['results']])
         self.client.credentials()
         project.delete()
 
@@ -966,6 +1166,35 @@ class ApplicationApiTestCase(TestCase):
         self.client.credentials()
         project.delete()
 
+    def test_api_application_bulk_destroy(self):
+        self.set_credentials(self.user1)
+        project = Project.objects.create(**self.project_info)
+        participant = Participant.objects.create(title='Part1', description='PartDesc1', project=project)
+        applications = [Application.objects.create(vacancy=participant, applicant=user)
+                        for user in [self.user1, self.user2]]
+        new_project_info = self.project_info.copy()
+        new_project_info['creator'] = self.user2
+        other_project = Project.objects.create(**new_project_info)
+        other_participant = Participant.objects.create(title='Part2', description='PartDesc2', project=other_project)
+        other_application = Application.objects.create(vacancy=other_participant, applicant=self.user2)
+        ids = [application.id for application in applications]
+        response = self.client.post('/api/applications/bulk_destroy/', data={'ids': ids + [other_application.id]},
+                                    format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(2, participant.applications.count())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/applications/bulk_destroy/', data={'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(0, participant.applications.count())
+        self.assertEqual(1, sum(query['sql'].startswith('DELETE') for query in queries))
+        self.assertEqual(['Ваша заявка на роль Part1 в проекте Title1 отклонена'],
+                         list(self.user2.notifications.values_list('text', flat=True)))
+        self.assertFalse(self.user1.notifications.exists())
+        self.client.credentials()
+        self.user2.notifications.all().delete()
+        project.delete()
+        other_project.delete()
+
     def test_api_application_destroy_unauthorized(self):
         project = Project.objects.create(**self.project_info)
         participant = Participant.objects.create(title='Part1', description='PartDesc1', project=project)
@@ -1060,6 +1289,49 @@ class NotificationApiTestCase(TestCase):
         self.client.credentials()
         notification.delete()
 
+    def test_api_notifications_mine_cursor(self):
+        self.set_credentials(self.user1)
+        notifications = [Notification.objects.create(user=self.user1, text=f'Notif{i}') for i in range(7)]
+        Notification.objects.filter(user=self.user1).update(timestamp=notifications[0].timestamp)
+        response = self.client.get('/api/notifications/mine/?cursor=', format='json')
+        self.assertEqual(response.status_code, 200)
+        first_page = [x['id'] for x in response.json()['results']]
+        self.assertEqual([x.id for x in notifications[::-1][:5]], first_page)
+        response = self.client.get(response.json()['next'], format='json')
+        self.assertEqual([x.id for x in notifications[::-1][5:]], [x['id'] for x in response.json()['results']])
+        self.assertIsNone(response.json()['next'])
+        response = self.client.get(response.json()['previous'], format='json')
+        self.assertEqual(first_page, [x['id'] for x in response.json()['results']])
+        self.assertIsNone(response.json()['previous'])
+        for position in ([None, 1], ['abc', 1], [{'id': 1}, 1], [1, 2, 3]):
+            response = self.client.get('/api/notifications/mine/', {'cursor': encode_cursor(position)}, format='json')
+            self.assertEqual(response.status_code, 404)
+        self.client.credentials()
+        Notification.objects.filter(user=self.user1).delete()
+
+    def test_api_notifications_bulk_read(self):
+        self.set_credentials(self.user1)
+        notifications = [Notification.objects.create(user=self.user1, text=f'Notif{i}') for i in range(3)]
+        other = Notification.objects.create(user=self.user2, text='Other')
+        ids = [notification.id for notification in notifications[:2]]
+        response = self.client.post('/api/notifications/bulk_read/', data={'ids': ids + [other.id]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(3, self.user1.notifications.filter(unread=True).count())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/notifications/bulk_read/', data={'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(1, sum(query['sql'].startswith('UPDATE') for query in queries))
+        self.assertEqual([notifications[2].id], list(self.user1.notifications.filter(unread=True).values_list(
+            'id', flat=True)))
+        response = self.client.post('/api/notifications/bulk_unread/', data={'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(3, self.user1.notifications.filter(unread=True).count())
+        self.assertTrue(Notification.objects.get(pk=other.pk).unread)
+        response = self.client.post('/api/notifications/bulk_read/', data={'ids': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.credentials()
+        Notification.objects.filter(user__in=[self.user1, self.user2]).delete()
+
     def test_api_notifications_mine_unauthorized(self):
         response = self.client.get(f'/api/notifications/mine/', format='json')
         self.assertEqual(response.status_code, 401)
@@ -1228,3 +1500,61 @@ class NotificationApiTestCase(TestCase):
         cls.user1.delete()
         cls.user2.delete()
         cls.mock_authenticate.stop()
+
+
+class RendererTestCase(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpClass(cls):
+        cls.user1 = User.objects.create_user(email='vlad@vk.ru')
+        cls.mock_authenticate = patch('account.authentication.EmailAuthBackend.authenticate').start()
+        cls.mock_authenticate.return_value = cls.user1
+
+    def set_credentials(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client.credentials(HTTP_HSE_AUTH=token.key)
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {'title': 'Проект', 'created': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901),
+                'deadline': datetime.date(2024, 1, 2), 'rating': 3.5, 'tags': [1, 2], 'empty': None}
+        self.assertEqual(JSONRenderer().render(data), FastJSONRenderer().render(data))
+        with patch('api.renderers.orjson', None):
+            self.assertEqual(JSONRenderer().render(data), FastJSONRenderer().render(data))
+        self.assertEqual(b'', FastJSONRenderer().render(None))
+
+    def test_fast_renderer_escapes_line_separators(self):
+        data = {'description': 'a\u2028b\u2029c'}
+        self.assertEqual(b'{"description":"a\\u2028b\\u2029c"}', FastJSONRenderer().render(data))
+        self.assertEqual(JSONRenderer().render(data), FastJSONRenderer().render(data))
+        with patch.object(FastJSONRenderer, 'ensure_ascii', True):
+            self.assertEqual(b'{"description":"a\\u2028b\\u2029c"}', FastJSONRenderer().render(data))
+
+    def test_fast_renderer_non_finite_floats(self):
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({'rating': float('nan')})
+        self.assertEqual(b'{"rating":null}', FastJSONRenderer().render({'rating': float('nan')}))
+
+    def test_fast_parser(self):
+        self.set_credentials(self.user1)
+        response = self.client.post('/api/projects/bulk_rate/', data='{"ratings": [', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['detail'].startswith('JSON parse error'))
+        response = self.client.post('/api/notifications/bulk_read/', data='{"ids": []}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ids', response.json())
+        self.client.credentials()
+
+    def test_benchmark_renderers(self):
+        stdout = io.StringIO()
+        call_command('benchmarkrenderers', '--projects', '20', '--repeat', '2', stdout=stdout)
+        report = json.loads(stdout.getvalue())
+        self.assertEqual({'json', 'fast'}, set(report['results']))
+        self.assertEqual(report['results']['json']['bytes'], report['results']['fast']['bytes'])
+        self.assertFalse(Project.objects.filter(title__startswith='Benchmark').exists())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user1.delete()
+        cls.mock_authenticate.stop()
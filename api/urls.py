@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework import routers
 
 from api.views import UserViewSet, InterestViewSet, ProjectViewSet, CheckpointViewSet, \
-    ParticipantViewSet, ApplicationViewSet, InvolvedProjectList, MineProjectList, NotificationViewSet, RatedProjectList
+    ParticipantViewSet, ApplicationViewSet, InvolvedProjectList, MineProjectList, NotificationViewSet, \
+    RatedProjectList, RecommendationStatsView
 
 router = routers.DefaultRouter()
 router.register(r'users', UserViewSet, basename='users')
@@ -19,5 +20,6 @@ urlpatterns = [
     path('projects/involved/', InvolvedProjectList.as_view(), name='involved'),
     path('projects/mine/', MineProjectList.as_view(), name='mine'),
     path('projects/rated/', RatedProjectList.as_view(), name='rated'),
+    path('recommendations/stats/', RecommendationStatsView.as_view(), name='recommendation_stats'),
     path('', include(router.urls)),
 ]
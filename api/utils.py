@@ -1,7 +1,10 @@
 from django.contrib.auth import authenticate, get_user_model
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 
 from account.models import User
+from participants.models import Participant
+from projects.models import Project
 
 
 def get_and_authenticate_user(email, password):
@@ -9,3 +12,37 @@ def get_and_authenticate_user(email, password):
     if user is None:
         raise serializers.ValidationError("Invalid username/password. Please try again!")
     return user
+
+
+class MembershipIndex:
+    def __init__(self, user):
+        self.user = user
+        self._project_ids = None
+
+    def is_member(self, project_id):
+        if self._project_ids is None:
+            self._project_ids = set(
+                Participant.objects.filter(participant=self.user).values_list('project_id', flat=True).union(
+                    Project.objects.filter(creator=self.user).values_list('id', flat=True)))
+        return project_id in self._project_ids
+
+
+def get_memberships(context):
+    if 'memberships' not in context:
+        context['memberships'] = MembershipIndex(context['request'].user)
+    return context['memberships']
+
+
+def get_field_options(request, expandable):
+    fields = _split_param(request.query_params.get('fields'))
+    expand = _split_param(request.query_params.get('expand')) or set()
+    unknown = expand - set(expandable)
+    if unknown:
+        raise ValidationError({'expand': [f'Недопустимые значения: {", ".join(sorted(unknown))}']})
+    return fields, expand
+
+
+def _split_param(value):
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
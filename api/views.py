@@ -1,19 +1,21 @@
-from django.db.models import Count, Q
-
+from django.db import transaction
+from django.db.models import Q
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import ListAPIView
 from rest_framework.mixins import DestroyModelMixin, UpdateModelMixin
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 
 from account.models import Interest, User
 from api.filters import ProjectFilterBackend
 
-from api.pagination import ProjectPagination, CheckpointPagination
+from api.pagination import ProjectPagination, CheckpointPagination, ApplicationPagination, NotificationPagination
 
 from api.permissions import ProjectPermission, ApplicationPermission, ParticipantPermission, CheckpointPermission, \
     UserPermission, NotificationPermission
@@ -21,19 +23,23 @@ from api.serializers import UserInfoSerializer, InterestSerializer, ProjectReadO
     CheckpointReadOnlySerializer, ParticipantSerializer, ProjectCreateSerializer, \
     ApplicationReadOnlySerializer, UserLoginSerializer, AuthUserSerializer, ProjectUpdateSerializer, \
     CheckpointUpdateSerializer, ProjectRecommendedSerializer, UserUpdateSerializer, NotificationSerializer, \
-    RatingWriteOnlySerializer, RatingReadOnlySerializer
-from api.utils import get_and_authenticate_user
+    RatingWriteOnlySerializer, RatingReadOnlySerializer, CandidateSerializer, SparseFieldsMixin, IdListSerializer, \
+    BulkRatingSerializer
+from api.utils import get_and_authenticate_user, get_field_options
 from applications.models import Application
 from checkpoints.models import Checkpoint
 from notifications.models import Notification
 from notifications.utils import create_notifications_application_accept, create_notification_application_reject, \
-    create_notification_participant_clear
+    create_notification_participant_clear, create_notifications_applications_reject
 from participants.models import Participant
 from projects.models import Project, Rating
 
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
 
-from projects.recommendation import recommend_projects
+from projects.artifacts import load_model
+from projects.profiling import get_stats, reset_stats
+from projects.recommendation import recommend_projects, get_similar_projects, suggest_candidates
+from projects.utils import rate_projects
 
 
 class UserViewSet(RetrieveModelMixin, UpdateModelMixin, GenericViewSet):
@@ -92,7 +98,8 @@ class InvolvedProjectList(ListAPIView):
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        return Project.objects.filter(participants__participant=self.request.user).distinct()
+        return Project.objects.filter(participants__participant=self.request.user).distinct().with_stats(
+            self.request.user)
 
 
 class MineProjectList(ListAPIView):
@@ -100,7 +107,7 @@ class MineProjectList(ListAPIView):
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        return Project.objects.filter(creator=self.request.user)
+        return Project.objects.filter(creator=self.request.user).with_stats(self.request.user)
 
 
 class RatedProjectList(ListAPIView):
@@ -108,11 +115,10 @@ class RatedProjectList(ListAPIView):
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        return Project.objects.filter(ratings__user=self.request.user)
+        return Project.objects.filter(ratings__user=self.request.user).with_stats(self.request.user)
 
 
 class ProjectViewSet(ModelViewSet):
-    queryset = Project.objects.all()
     filter_backends = [ProjectFilterBackend]
     permission_classes = (ProjectPermission,)
     pagination_class = ProjectPagination
@@ -130,8 +136,24 @@ class ProjectViewSet(ModelViewSet):
             return ParticipantSerializer
         if self.action == 'rate':
             return RatingWriteOnlySerializer
+        if self.action == 'bulk_rate':
+            return BulkRatingSerializer
         return ProjectReadOnlySerializer
 
+    def get_queryset(self):
+        fields, expand = self.get_field_options()
+        return Project.objects.with_stats(self.request.user.pk, fields=fields).with_expansions(expand)
+
+    def get_field_options(self):
+        if self.action not in ['list', 'retrieve', 'recommended', 'similar']:
+            return None, set()
+        return get_field_options(self.request, SparseFieldsMixin.expandable_fields)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_field_options()
+        return context
+
     def perform_create(self, serializer):
         kwargs = {
             'creator': self.request.user
@@ -147,10 +169,9 @@ class ProjectViewSet(ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def recommended(self, request):
-        recommended_projects = self.filter_queryset(recommend_projects(request.user.pk).exclude(
-            status=Project.COMPLETED).annotate(
-            number_of_vacancies=Count('participants', filter=Q(participants__participant=None), distinct=True)
-        ).distinct().filter(number_of_vacancies__gt=0))
+        fields, expand = self.get_field_options()
+        recommended_projects = self.filter_queryset(
+            recommend_projects(request.user.pk).with_stats(fields=fields).with_expansions(expand))
         page = self.paginate_queryset(recommended_projects)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -159,6 +180,16 @@ class ProjectViewSet(ModelViewSet):
         serializer = self.get_serializer(recommended_projects, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(responses={
+        200: ProjectReadOnlySerializer(many=True)
+    })
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        project = self.get_object()
+        projects = get_similar_projects(project.pk, queryset=self.get_queryset())
+        serializer = self.get_serializer(projects, many=True)
+        return Response(serializer.data)
+
     @swagger_auto_schema(responses={
         200: CheckpointReadOnlySerializer(many=True)
     })
@@ -199,6 +230,18 @@ class ProjectViewSet(ModelViewSet):
         serializer = RatingReadOnlySerializer(rating_obj)
         return Response(serializer.data)
 
+    @swagger_auto_schema(responses={
+        200: RatingReadOnlySerializer(many=True)
+    })
+    @action(detail=False, methods=['post'])
+    def bulk_rate(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ratings = rate_projects(request.user, {item['project']: item['rating']
+                                               for item in serializer.validated_data['ratings']})
+        serializer = RatingReadOnlySerializer(ratings, many=True)
+        return Response(serializer.data)
+
 
 class CheckpointViewSet(UpdateModelMixin, RetrieveModelMixin, GenericViewSet):
     queryset = Checkpoint.objects.all()
@@ -227,10 +270,13 @@ class CheckpointViewSet(UpdateModelMixin, RetrieveModelMixin, GenericViewSet):
 class ParticipantViewSet(UpdateModelMixin, RetrieveModelMixin, GenericViewSet):
     queryset = Participant.objects.all()
     permission_classes = (ParticipantPermission,)
+    pagination_class = ApplicationPagination
 
     def get_serializer_class(self):
         if self.action == 'applications':
             return ApplicationReadOnlySerializer
+        if self.action == 'candidates':
+            return CandidateSerializer
         return ParticipantSerializer
 
     def get_serializer(self, *args, **kwargs):
@@ -270,16 +316,33 @@ class ParticipantViewSet(UpdateModelMixin, RetrieveModelMixin, GenericViewSet):
     @action(detail=True, methods=['get'])
     def applications(self, request, pk=None):
         participant = self.get_object()
-        applications = participant.applications
+        applications = participant.applications.with_details()
+        page = self.paginate_queryset(applications)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
         serializer = self.get_serializer(applications, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(responses={
+        200: CandidateSerializer(many=True)
+    })
+    @action(detail=True, methods=['get'])
+    def candidates(self, request, pk=None):
+        participant = self.get_object()
+        serializer = self.get_serializer(suggest_candidates(participant), many=True)
+        return Response(serializer.data)
+
 
 class ApplicationViewSet(RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
     queryset = Application.objects.all()
     permission_classes = (ApplicationPermission,)
+    pagination_class = ApplicationPagination
 
     def get_serializer_class(self):
+        if self.action == 'bulk_destroy':
+            return IdListSerializer
         return ApplicationReadOnlySerializer
 
     def get_serializer(self, *args, **kwargs):
@@ -289,7 +352,12 @@ class ApplicationViewSet(RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
 
     @action(detail=False, methods=['get'])
     def mine(self, request):
-        applications = Application.objects.filter(applicant=request.user)
+        applications = Application.objects.filter(applicant=request.user).with_details()
+        page = self.paginate_queryset(applications)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
         serializer = self.get_serializer(applications, many=True)
         return Response(serializer.data)
 
@@ -304,6 +372,23 @@ class ApplicationViewSet(RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
         participant.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @swagger_auto_schema(responses={204: ""})
+    @action(detail=False, methods=['post'])
+    def bulk_destroy(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        applications = list(Application.objects.filter(
+            Q(applicant=request.user) | Q(vacancy__project__creator=request.user), pk__in=ids).select_related(
+            'vacancy__project'))
+        if len(applications) != len(ids):
+            raise NotFound('Заявки не найдены')
+        with transaction.atomic():
+            create_notifications_applications_reject(
+                [application for application in applications if application.applicant_id != request.user.pk])
+            Application.objects.filter(pk__in=ids).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     def perform_destroy(self, instance):
         if instance.applicant != self.request.user:
             create_notification_application_reject(instance)
@@ -313,8 +398,11 @@ class ApplicationViewSet(RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
 class NotificationViewSet(RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
     queryset = Notification.objects.all()
     permission_classes = (NotificationPermission,)
+    pagination_class = NotificationPagination
 
     def get_serializer_class(self):
+        if self.action in ['bulk_read', 'bulk_unread']:
+            return IdListSerializer
         return NotificationSerializer
 
     def get_serializer(self, *args, **kwargs):
@@ -324,7 +412,12 @@ class NotificationViewSet(RetrieveModelMixin, DestroyModelMixin, GenericViewSet)
 
     @action(detail=False, methods=['get'])
     def mine(self, request):
-        notifications = request.user.notifications.all()
+        notifications = request.user.notifications.order_by('-timestamp')
+        page = self.paginate_queryset(notifications)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
         serializer = self.get_serializer(notifications, many=True)
         return Response(serializer.data)
 
@@ -358,9 +451,40 @@ class NotificationViewSet(RetrieveModelMixin, DestroyModelMixin, GenericViewSet)
         notification.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @swagger_auto_schema(responses={204: ""})
+    @action(detail=False, methods=['post'])
+    def bulk_read(self, request):
+        return self._bulk_update(request, unread=False)
+
+    @swagger_auto_schema(responses={204: ""})
+    @action(detail=False, methods=['post'])
+    def bulk_unread(self, request):
+        return self._bulk_update(request, unread=True)
+
+    def _bulk_update(self, request, **values):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        with transaction.atomic():
+            if request.user.notifications.filter(pk__in=ids).update(**values) != len(ids):
+                raise NotFound('Уведомления не найдены')
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @swagger_auto_schema(responses={204: ""})
     @action(detail=False, methods=['post'])
     def clear(self, request):
         notifications = request.user.notifications.all()
         notifications.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RecommendationStatsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_stats(load_model()))
+
+    @swagger_auto_schema(responses={204: ""})
+    def delete(self, request):
+        reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -5,6 +5,12 @@ from account.models import User
 from participants.models import Participant
 
 
+class ApplicationQuerySet(models.QuerySet):
+    def with_details(self):
+        return self.select_related('vacancy', 'applicant').prefetch_related('applicant__interests').order_by(
+            'created', 'id')
+
+
 class Application(models.Model):
     '''
     SUBMITTED = "SU"
@@ -26,3 +32,5 @@ class Application(models.Model):
                                   related_name='applications')
     created = models.DateTimeField(auto_now_add=True)
     # status = models.CharField(max_length=2, choices=STATUS_CHOICES, default=SUBMITTED)
+
+    objects = ApplicationQuerySet.as_manager()
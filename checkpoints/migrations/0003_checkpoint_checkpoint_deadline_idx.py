@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkpoints', '0002_alter_checkpoint_options_remove_checkpoint_custom_id'),
+        ('projects', '0010_project_project_candidate_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checkpoint',
+            index=models.Index(fields=['deadline', 'id'], name='checkpoint_deadline_idx'),
+        ),
+    ]
@@ -12,3 +12,8 @@ class Checkpoint(models.Model):
     project = models.ForeignKey(Project,
                                 on_delete=models.CASCADE,
                                 related_name='checkpoints')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deadline', 'id'], name='checkpoint_deadline_idx'),
+        ]
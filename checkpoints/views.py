@@ -3,9 +3,10 @@ from django.views.generic import ListView
 
 from checkpoints.models import Checkpoint
 from projects.models import Project
+from studentProjects.pagination import KeysetPaginationMixin
 
 
-class CheckpointListView(LoginRequiredMixin, ListView):
+class CheckpointListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     def get_queryset(self):
         projects = Project.objects.filter(participants__in=self.request.user.participations.all()).exclude(
             status=Project.COMPLETED)
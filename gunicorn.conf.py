@@ -0,0 +1,13 @@
+import logging
+
+# The application and the published recommendation model are loaded once in the master process,
+# so workers share the model pages copy-on-write
+preload_app = True
+
+
+def post_fork(server, worker):
+    from projects.artifacts import warm_up_model
+    try:
+        warm_up_model()
+    except Exception:
+        logging.getLogger('projects.recommendation').exception('Recommendation model warm-up failed')
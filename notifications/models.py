@@ -7,4 +7,9 @@ class Notification(models.Model):
     text = models.CharField(max_length=200)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     timestamp = models.DateTimeField(auto_now_add=True)
-    unread = models.BooleanField(default=True)
\ No newline at end of file
+    unread = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-timestamp', '-id'], name='notification_timeline_idx'),
+        ]
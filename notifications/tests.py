@@ -4,6 +4,7 @@ from django.test import TestCase
 from django.urls import reverse
 
 from account.models import User
+from studentProjects.pagination import encode_cursor
 
 from notifications.models import Notification
 
@@ -23,6 +24,28 @@ class NotificationTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.client.logout()
 
+    def test_notifications_list_cursor(self):
+        notifications = [Notification.objects.create(text=f'Aaa{i}', user=self.user1) for i in range(7)]
+        self.client.login(email=self.user1.email)
+        url = reverse('notifications:notifications_list')
+        response = self.client.get(url + '?cursor=')
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page_obj']
+        self.assertEqual(notifications[::-1][:5], list(page))
+        response = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertEqual(notifications[::-1][5:], list(response.context['page_obj']))
+        self.assertFalse(response.context['page_obj'].has_next())
+        response = self.client.get(url, {'cursor': page.last_cursor})
+        self.assertEqual(notifications[::-1][2:], list(response.context['page_obj']))
+        response = self.client.get(url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+        for position in ([None, 1], ['abc', 1], [str(notifications[0].timestamp), 'abc'], [[1], 1], [1]):
+            response = self.client.get(url, {'cursor': encode_cursor(position)})
+            self.assertEqual(response.status_code, 404)
+        self.client.logout()
+        for notification in notifications:
+            notification.delete()
+
     def test_notifications_list_unauthorized(self):
         url = reverse('notifications:notifications_list')
         response = self.client.get(url)
@@ -17,6 +17,15 @@ def create_notification_application_reject(application):
     Notification.objects.create(user=application.applicant, text=text)
 
 
+def create_notifications_applications_reject(applications):
+    Notification.objects.bulk_create([
+        Notification(user_id=application.applicant_id,
+                     text=f'Ваша заявка на роль {application.vacancy.title} в проекте '
+                          f'{application.vacancy.project.title} отклонена')
+        for application in applications
+    ])
+
+
 def create_notification_participant_clear(participant):
     text = f'Вы были удалены с роли {participant.title} в проекте {participant.project.title}'
     Notification.objects.create(user=participant.participant, text=text)
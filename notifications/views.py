@@ -6,9 +6,10 @@ from django.views.generic import ListView
 
 from notifications.mixins import NotificationIsForUserRequiredMixin
 from notifications.models import Notification
+from studentProjects.pagination import KeysetPaginationMixin
 
 
-class NotificationListView(LoginRequiredMixin, ListView):
+class NotificationListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     paginate_by = 5
     context_object_name = 'notifications'
     template_name = 'notifications/list.html'
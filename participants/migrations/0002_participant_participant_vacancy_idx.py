@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('participants', '0001_initial'),
+        ('projects', '0010_project_project_candidate_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(condition=models.Q(('participant', None)), fields=['project'], name='participant_vacancy_idx'),
+        ),
+    ]
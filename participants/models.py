@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 
 from account.models import User
 from projects.models import Project
@@ -14,3 +15,8 @@ class Participant(models.Model):
                                     on_delete=models.CASCADE,
                                     related_name='participations',
                                     null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project'], condition=Q(participant=None), name='participant_vacancy_idx'),
+        ]
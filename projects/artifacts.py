@@ -0,0 +1,285 @@
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from functools import cached_property
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from projects.profiling import profiled
+
+FORMAT_VERSION = 6
+CURRENT_FILENAME = 'CURRENT'
+MANIFEST_FILENAME = 'manifest.json'
+LOCK_FILENAME = '.lock'
+KEEP_VERSIONS = 3
+LOAD_ATTEMPTS = 3
+COLLABORATIVE_ARRAYS = ('user_ids', 'item_ids', 'pu', 'qi', 'bu', 'bi', 'rated_indptr', 'rated_items')
+CONTENT_ARRAYS = ('interest_ids', 'tags_indptr', 'tags_indices')
+INDEX_ARRAYS = ('ann_planes', 'ann_codes', 'ann_order')
+ARRAYS = COLLABORATIVE_ARRAYS + CONTENT_ARRAYS + INDEX_ARRAYS
+
+_loaded = {'key': None, 'model': None}
+
+
+class RecommendationModel:
+    def __init__(self, manifest, arrays):
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.ratings_version = manifest['ratings_version']
+        self.catalogue_version = manifest['catalogue_version']
+        self.factors_version = manifest['factors_version']
+        self.created = manifest['created']
+        self.trained = manifest['trained']
+        self.global_mean = manifest['global_mean']
+        self.rating_scale = tuple(manifest['rating_scale'])
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def user_row(self, user_id):
+        return _find_row(self.user_ids, user_id)
+
+    def item_row(self, item_id):
+        return _find_row(self.item_ids, item_id)
+
+    def item_rows(self, item_ids):
+        rows = np.searchsorted(self.item_ids, item_ids)
+        known = rows < len(self.item_ids)
+        known[known] = self.item_ids[rows[known]] == item_ids[known]
+        return rows[known]
+
+    def interest_columns(self, interest_ids):
+        columns, known = find_rows(self.interest_ids, np.asarray(interest_ids, dtype=np.int64))
+        return np.unique(columns[known])
+
+    def user_rated_items(self, row):
+        return self.rated_items[self.rated_indptr[row]:self.rated_indptr[row + 1]]
+
+    def collaborative_arrays(self):
+        meta = {'global_mean': self.global_mean, 'rating_scale': list(self.rating_scale),
+                'factors_version': self.factors_version, 'trained': self.trained}
+        return {name: np.array(getattr(self, name)) for name in COLLABORATIVE_ARRAYS}, meta
+
+    @cached_property
+    def tags_matrix(self):
+        return binary_csr(self.tags_indptr, self.tags_indices, len(self.interest_ids))
+
+    def warm_up(self):
+        for name in ARRAYS:
+            np.add.reduce(getattr(self, name), axis=None)
+        return self.tags_matrix
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+
+def _find_row(ids, value):
+    row = np.searchsorted(ids, value)
+    if row < len(ids) and ids[row] == value:
+        return int(row)
+    return None
+
+
+def find_rows(ids, values):
+    rows = np.minimum(np.searchsorted(ids, values), max(len(ids) - 1, 0))
+    known = ids[rows] == values if len(ids) else np.zeros(len(values), dtype=bool)
+    return rows, known
+
+
+def binary_csr(indptr, indices, n_columns):
+    data = np.ones(len(indices), dtype=np.float32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, n_columns))
+
+
+def empty_arrays(n_factors=0):
+    return {
+        'user_ids': np.empty(0, dtype=np.int64),
+        'item_ids': np.empty(0, dtype=np.int64),
+        'pu': np.empty((0, n_factors), dtype=np.float32),
+        'qi': np.empty((0, n_factors), dtype=np.float32),
+        'bu': np.empty(0, dtype=np.float32),
+        'bi': np.empty(0, dtype=np.float32),
+        'rated_indptr': np.zeros(1, dtype=np.int64),
+        'rated_items': np.empty(0, dtype=np.int32),
+    }
+
+
+def reindex_items(arrays, item_ids):
+    keep = np.isin(arrays['item_ids'], item_ids)
+    if not np.all(keep[arrays['rated_items']]):
+        raise ValueError('Rated items are missing from the catalogue')
+    positions = np.searchsorted(item_ids, arrays['item_ids'])
+    qi = np.zeros((len(item_ids), arrays['qi'].shape[1]), dtype=np.float32)
+    qi[positions[keep]] = arrays['qi'][keep]
+    bi = np.zeros(len(item_ids), dtype=np.float32)
+    bi[positions[keep]] = arrays['bi'][keep]
+    return dict(arrays, item_ids=item_ids, qi=qi, bi=bi,
+                rated_items=positions[arrays['rated_items']].astype(np.int32))
+
+
+def arrays_from_svd(model):
+    trainset = model.trainset
+    user_raw = np.array([trainset.to_raw_uid(u) for u in range(trainset.n_users)], dtype=np.int64)
+    item_raw = np.array([trainset.to_raw_iid(i) for i in range(trainset.n_items)], dtype=np.int64)
+    user_order = np.argsort(user_raw)
+    item_order = np.argsort(item_raw)
+    item_rank = np.empty(trainset.n_items, dtype=np.int32)
+    item_rank[item_order] = np.arange(trainset.n_items, dtype=np.int32)
+    rated = [np.sort(item_rank[[inner_iid for inner_iid, _ in trainset.ur[u]]]) for u in user_order]
+    rated_indptr = np.zeros(trainset.n_users + 1, dtype=np.int64)
+    np.cumsum([len(items) for items in rated], out=rated_indptr[1:])
+    pu = getattr(model, 'pu', np.empty((trainset.n_users, 0)))
+    qi = getattr(model, 'qi', np.empty((trainset.n_items, 0)))
+    return {
+        'user_ids': user_raw[user_order],
+        'item_ids': item_raw[item_order],
+        'pu': pu[user_order],
+        'qi': qi[item_order],
+        'bu': model.bu[user_order],
+        'bi': model.bi[item_order],
+        'rated_indptr': rated_indptr,
+        'rated_items': np.concatenate(rated).astype(np.int32),
+    }, {
+        'global_mean': float(trainset.global_mean),
+        'rating_scale': list(trainset.rating_scale),
+    }
+
+
+def combine_arrays(arrays_list, weights):
+    combined = dict(arrays_list[0])
+    combined['pu'] = np.hstack([np.sqrt(w) * arrays['pu'] for arrays, w in zip(arrays_list, weights)])
+    combined['qi'] = np.hstack([np.sqrt(w) * arrays['qi'] for arrays, w in zip(arrays_list, weights)])
+    combined['bu'] = sum(w * arrays['bu'] for arrays, w in zip(arrays_list, weights))
+    combined['bi'] = sum(w * arrays['bi'] for arrays, w in zip(arrays_list, weights))
+    return combined
+
+
+def predict_pairs(arrays, global_mean, user_ids, item_ids):
+    user_rows, user_known = find_rows(arrays['user_ids'], user_ids)
+    item_rows, item_known = find_rows(arrays['item_ids'], item_ids)
+    both = user_known & item_known
+    dot = np.zeros(len(user_ids))
+    dot[both] = np.einsum('ij,ij->i', arrays['pu'][user_rows[both]], arrays['qi'][item_rows[both]])
+    return global_mean + np.where(user_known, arrays['bu'][user_rows], 0) + \
+        np.where(item_known, arrays['bi'][item_rows], 0) + dot
+
+
+def _cast(name, array):
+    if name in ('pu', 'qi', 'bu', 'bi', 'ann_planes'):
+        return np.ascontiguousarray(array, dtype=np.float32)
+    return np.ascontiguousarray(array)
+
+
+@contextmanager
+def publish_lock():
+    model_dir = settings.RECOMMENDATION_MODEL_DIR
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, LOCK_FILENAME), 'w') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@profiled('publish')
+def publish(arrays, meta, ratings_version, catalogue_version):
+    model_dir = settings.RECOMMENDATION_MODEL_DIR
+    os.makedirs(model_dir, exist_ok=True)
+    version = f'{time.strftime("%Y%m%d%H%M%S")}-{ratings_version}-{uuid.uuid4().hex[:8]}'
+    tmp_dir = tempfile.mkdtemp(dir=model_dir, prefix='.tmp-')
+    try:
+        for name in ARRAYS:
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), _cast(name, arrays[name]))
+        manifest = dict(meta, format=FORMAT_VERSION, version=version, ratings_version=ratings_version,
+                        catalogue_version=catalogue_version, created=time.time(),
+                        n_users=len(arrays['user_ids']), n_items=len(arrays['item_ids']),
+                        n_factors=arrays['qi'].shape[1], arrays=list(ARRAYS))
+        manifest.setdefault('factors_version', version)
+        manifest.setdefault('trained', manifest['created'])
+        with open(os.path.join(tmp_dir, MANIFEST_FILENAME), 'w') as f:
+            json.dump(manifest, f)
+        os.rename(tmp_dir, os.path.join(model_dir, version))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    previous = get_current_version()
+    _write_current(model_dir, version)
+    _remove_old_versions(model_dir, {version, previous})
+    return version
+
+
+def _write_current(model_dir, version):
+    fd, tmp_path = tempfile.mkstemp(dir=model_dir, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(model_dir, CURRENT_FILENAME))
+
+
+def _remove_old_versions(model_dir, protected):
+    versions = sorted((name for name in os.listdir(model_dir)
+                       if not name.startswith('.') and os.path.isdir(os.path.join(model_dir, name))),
+                      key=lambda name: _published_at(os.path.join(model_dir, name)))
+    for name in versions[:-KEEP_VERSIONS]:
+        if name not in protected:
+            shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
+
+
+def _published_at(version_dir):
+    try:
+        with open(os.path.join(version_dir, MANIFEST_FILENAME)) as f:
+            return json.load(f)['created']
+    except (OSError, ValueError, KeyError):
+        return os.path.getmtime(version_dir)
+
+
+def get_current_version():
+    try:
+        with open(os.path.join(settings.RECOMMENDATION_MODEL_DIR, CURRENT_FILENAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+@profiled('load_model')
+def load_model():
+    for _ in range(LOAD_ATTEMPTS):
+        version = get_current_version()
+        if version is None:
+            return None
+        try:
+            return _load_version(os.path.join(settings.RECOMMENDATION_MODEL_DIR, version))
+        except FileNotFoundError:
+            continue
+    return _loaded['model']
+
+
+def _load_version(version_dir):
+    if _loaded['key'] != version_dir:
+        with open(os.path.join(version_dir, MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT_VERSION:
+            return None
+        arrays = {name: np.load(os.path.join(version_dir, f'{name}.npy'), mmap_mode='r')
+                  for name in manifest['arrays']}
+        _loaded['model'] = RecommendationModel(manifest, arrays)
+        _loaded['key'] = version_dir
+    return _loaded['model']
+
+
+def warm_up_model():
+    model = load_model()
+    if model is not None:
+        model.warm_up()
+    return model
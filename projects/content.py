@@ -0,0 +1,50 @@
+import numpy as np
+from django.db.models import Max, Count
+
+from account.models import Interest, User
+from projects.models import Project
+
+
+def get_catalogue_version():
+    stats = []
+    for model in (Project, Project.tags.through):
+        aggregate = model.objects.aggregate(max_id=Max('id'), count=Count('id'))
+        stats.append(f"{aggregate['max_id'] or 0}.{aggregate['count']}")
+    return '-'.join(stats)
+
+
+def get_project_ids():
+    return np.array(Project.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+
+
+def build_content_arrays(item_ids):
+    interest_ids = np.array(Interest.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    tags_indptr, tags_indices = _build_csr(
+        item_ids, interest_ids, Project.tags.through.objects.values_list('project_id', 'interest_id'))
+    return {
+        'interest_ids': interest_ids,
+        'tags_indptr': tags_indptr,
+        'tags_indices': tags_indices,
+    }
+
+
+def build_interest_arrays(interest_ids):
+    interest_user_ids = np.array(User.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    interests_indptr, interests_indices = _build_csr(
+        interest_user_ids, interest_ids, User.interests.through.objects.values_list('user_id', 'interest_id'))
+    return {
+        'interest_user_ids': interest_user_ids,
+        'interests_indptr': interests_indptr,
+        'interests_indices': interests_indices,
+    }
+
+
+def _build_csr(row_ids, column_ids, pairs):
+    pairs = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+    pairs = pairs[np.isin(pairs[:, 0], row_ids) & np.isin(pairs[:, 1], column_ids)]
+    rows = np.searchsorted(row_ids, pairs[:, 0])
+    columns = np.searchsorted(column_ids, pairs[:, 1])
+    order = np.lexsort((columns, rows))
+    indptr = np.zeros(len(row_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(row_ids)), out=indptr[1:])
+    return indptr, columns[order].astype(np.int32)
@@ -0,0 +1,143 @@
+import time
+
+import numpy as np
+from scipy import sparse
+from surprise import SVD
+
+from projects.artifacts import arrays_from_svd, binary_csr, find_rows
+from projects.recommendation import build_trainset, RATING_SCALE
+
+BASELINE = 'interests'
+RELEVANT_RATING = 4
+BLOCK_SIZE = 1000
+
+_data = {}
+
+
+def split_ratings(user_ids, project_ids, values, test_size):
+    n_train = len(values) - int(round(len(values) * test_size))
+    return (user_ids[:n_train], project_ids[:n_train], values[:n_train]), \
+        (user_ids[n_train:], project_ids[n_train:], values[n_train:])
+
+
+def prepare(train, test, item_ids, content):
+    _data.update(train=train, test=test, item_ids=item_ids, content=content)
+
+
+def evaluate(config, k):
+    train, test, item_ids = _data['train'], _data['test'], _data['item_ids']
+    start = time.perf_counter()
+    if config == BASELINE:
+        scorer = InterestScorer(train, item_ids, _data['content'])
+    else:
+        scorer = FactorScorer(train, item_ids, config)
+    train_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    precision, recall = ranking_metrics(scorer, item_ids, train, test, k)
+    return {
+        'config': config,
+        'rmse': rmse(scorer, test),
+        f'precision@{k}': precision,
+        f'recall@{k}': recall,
+        'train_seconds': train_seconds,
+        'eval_seconds': time.perf_counter() - start,
+    }
+
+
+def rmse(scorer, test):
+    user_ids, project_ids, values = test
+    if not len(values):
+        return None
+    return float(np.sqrt(np.mean((scorer.predict(user_ids, project_ids) - values) ** 2)))
+
+
+def ranking_metrics(scorer, item_ids, train, test, k):
+    relevant = test[2] >= RELEVANT_RATING
+    user_ids = np.unique(test[0][relevant])
+    if not len(user_ids):
+        return None, None
+    relevant_matrix = _pairs_matrix(user_ids, item_ids, test[0][relevant], test[1][relevant])
+    seen_matrix = _pairs_matrix(user_ids, item_ids, train[0], train[1])
+    k = min(k, len(item_ids))
+    hits = []
+    for start in range(0, len(user_ids), BLOCK_SIZE):
+        stop = start + BLOCK_SIZE
+        scores = scorer.score(user_ids[start:stop])
+        scores[seen_matrix[start:stop].nonzero()] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        hits.append(np.take_along_axis(relevant_matrix[start:stop].toarray(), top, axis=1).sum(axis=1))
+    hits = np.concatenate(hits)
+    return float(np.mean(hits / k)), float(np.mean(hits / np.diff(relevant_matrix.indptr)))
+
+
+def _pairs_matrix(row_ids, column_ids, rows, columns):
+    keep = np.isin(rows, row_ids) & np.isin(columns, column_ids)
+    rows = np.searchsorted(row_ids, rows[keep])
+    columns = np.searchsorted(column_ids, columns[keep])
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)),
+                               shape=(len(row_ids), len(column_ids)))
+    matrix.data[:] = 1
+    return matrix
+
+
+class FactorScorer:
+    def __init__(self, train, item_ids, params):
+        svd = SVD(random_state=0, **params)
+        svd.fit(build_trainset(*train))
+        arrays, meta = arrays_from_svd(svd)
+        self.global_mean = meta['global_mean']
+        self.user_ids, self.pu, self.bu = arrays['user_ids'], arrays['pu'], arrays['bu']
+        self.item_ids = item_ids
+        positions = np.searchsorted(item_ids, arrays['item_ids'])
+        self.qi = np.zeros((len(item_ids), arrays['qi'].shape[1]))
+        self.qi[positions] = arrays['qi']
+        self.bi = np.zeros(len(item_ids))
+        self.bi[positions] = arrays['bi']
+
+    def _user_factors(self, user_ids):
+        rows, known = find_rows(self.user_ids, user_ids)
+        return self.pu[rows] * known[:, None], self.bu[rows] * known
+
+    def score(self, user_ids):
+        pu, bu = self._user_factors(user_ids)
+        return self.global_mean + self.bi + bu[:, None] + pu @ self.qi.T
+
+    def predict(self, user_ids, project_ids):
+        pu, bu = self._user_factors(user_ids)
+        columns = np.searchsorted(self.item_ids, project_ids)
+        scores = self.global_mean + self.bi[columns] + bu + np.einsum('ij,ij->i', pu, self.qi[columns])
+        return np.clip(scores, *RATING_SCALE)
+
+
+class InterestScorer:
+    def __init__(self, train, item_ids, content):
+        self.global_mean = float(np.mean(train[2])) if len(train[2]) else float(np.mean(RATING_SCALE))
+        self.item_ids = item_ids
+        n_interests = len(content['interest_ids'])
+        self.tags = binary_csr(content['tags_indptr'], content['tags_indices'], n_interests)
+        self.user_ids = content['interest_user_ids']
+        self.interests = binary_csr(content['interests_indptr'], content['interests_indices'], n_interests)
+
+    def _user_interests(self, user_ids):
+        rows, known = find_rows(self.user_ids, user_ids)
+        if not len(self.user_ids):
+            return sparse.csr_matrix((len(user_ids), self.tags.shape[1]), dtype=np.float32)
+        interests = (sparse.diags(known.astype(np.float32)) @ self.interests[rows]).tocsr()
+        interests.eliminate_zeros()
+        return interests
+
+    def _scale(self, overlap, n_interests):
+        low, high = RATING_SCALE
+        scores = low + (high - low) * overlap / np.maximum(n_interests, 1)
+        return np.where(n_interests > 0, scores, self.global_mean)
+
+    def score(self, user_ids):
+        interests = self._user_interests(user_ids)
+        overlap = (interests @ self.tags.T).toarray()
+        return self._scale(overlap, interests.getnnz(axis=1)[:, None])
+
+    def predict(self, user_ids, project_ids):
+        interests = self._user_interests(user_ids)
+        tags = self.tags[np.searchsorted(self.item_ids, project_ids)]
+        overlap = np.asarray(interests.multiply(tags).sum(axis=1)).ravel()
+        return self._scale(overlap, interests.getnnz(axis=1))
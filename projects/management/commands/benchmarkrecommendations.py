@@ -0,0 +1,161 @@
+import datetime
+import json
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+
+from account.models import Interest, User
+from participants.models import Participant
+from projects.artifacts import arrays_from_svd, publish, load_model
+from projects.content import get_catalogue_version, get_project_ids
+from projects.models import Project, Rating, RatingsVersion
+from projects.recommendation import load_ratings, build_trainset, train_model, build_artifact_arrays, \
+    predict_ratings, store_recommendations, get_projects_queryset, get_candidate_ids
+
+DEFAULT_SIZES = (10 ** 4, 10 ** 5, 10 ** 6)
+N_INTERESTS = 20
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время и память этапов построения рекомендаций на синтетических рейтингах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Число рейтингов')
+        parser.add_argument('--sample-users', type=int, default=100,
+                            help='Число пользователей, для которых считаются рекомендации')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора данных')
+        parser.add_argument('--output', help='Файл для результатов в формате JSON (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        if min(options['sizes']) < 1 or options['sample_users'] < 1:
+            raise CommandError('Параметры должны быть положительными')
+        rng = np.random.default_rng(options['seed'])
+        tracemalloc.start()
+        results = []
+        try:
+            for size in options['sizes']:
+                results.append(self._run(size, options['sample_users'], rng))
+                self.stderr.write(f'{size} ratings: ' + ', '.join(
+                    f"{name} {stage['seconds']:.2f}s" for name, stage in results[-1]['stages'].items()))
+        finally:
+            tracemalloc.stop()
+        report = json.dumps({
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': _get_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(report)
+
+    def _run(self, size, sample_users, rng):
+        n_users = max(size // 20, 50)
+        n_projects = max(size // 50, 20)
+        size = min(size, n_users * n_projects)
+        stages = {}
+        with tempfile.TemporaryDirectory() as model_dir, override_settings(RECOMMENDATION_MODEL_DIR=model_dir), \
+                transaction.atomic():
+            user_ids = _generate(size, n_users, n_projects, rng)
+            with _stage(stages, 'fingerprint'):
+                ratings_version, catalogue_version = RatingsVersion.current(), get_catalogue_version()
+            with _stage(stages, 'loading'):
+                loaded = load_ratings(Rating.objects.all())
+            with _stage(stages, 'trainset'):
+                trainset = build_trainset(*loaded)
+            with _stage(stages, 'training'):
+                svd = train_model(trainset)
+            with _stage(stages, 'publishing'):
+                arrays, meta = arrays_from_svd(svd)
+                publish(build_artifact_arrays(arrays, get_project_ids()), meta, ratings_version, catalogue_version)
+            model = load_model()
+            sample = rng.choice(user_ids, min(sample_users, len(user_ids)), replace=False).tolist()
+            with _stage(stages, 'candidates'):
+                candidates = get_candidate_ids()
+            with _stage(stages, 'scoring'):
+                predictions = {user: predict_ratings(model, user, candidates=candidates) for user in sample}
+            with _stage(stages, 'queryset'):
+                for user, pred in predictions.items():
+                    store_recommendations(user, model.version, pred)
+                    list(get_projects_queryset(user, model.version))
+            transaction.set_rollback(True)
+        return {
+            'n_ratings': size,
+            'n_users': n_users,
+            'n_projects': n_projects,
+            'sample_users': len(sample),
+            'model_bytes': model.nbytes,
+            'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            'stages': stages,
+        }
+
+
+class _stage:
+    def __init__(self, stages, name):
+        self.stages = stages
+        self.name = name
+
+    def __enter__(self):
+        tracemalloc.reset_peak()
+        self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        self.stages[self.name] = {
+            'seconds': seconds,
+            'peak_traced_bytes': tracemalloc.get_traced_memory()[1] - self.start_memory,
+        }
+
+
+def _generate(size, n_users, n_projects, rng):
+    interests = Interest.objects.bulk_create([Interest(title=f'benchmark-{i}') for i in range(N_INTERESTS)])
+    users = User.objects.bulk_create([User(email=f'benchmark-{i}@example.com') for i in range(n_users)],
+                                     batch_size=BATCH_SIZE)
+    today = datetime.date.today()
+    projects = Project.objects.bulk_create(
+        [Project(title=f'Benchmark {i}', description='', creator=users[i % n_users],
+                 application_deadline=today + datetime.timedelta(days=30),
+                 completion_deadline=today + datetime.timedelta(days=90)) for i in range(n_projects)],
+        batch_size=BATCH_SIZE)
+    Participant.objects.bulk_create([Participant(title='Role', description='', project=project)
+                                     for project in projects], batch_size=BATCH_SIZE)
+    _bulk_tag(Project.tags.through, 'project_id', projects, interests, rng)
+    _bulk_tag(User.interests.through, 'user_id', users, interests, rng)
+    pairs = rng.choice(n_users * n_projects, size, replace=False)
+    values = rng.integers(0, 6, size)
+    for start in range(0, size, BATCH_SIZE):
+        Rating.objects.bulk_create([
+            Rating(user=users[pair // n_projects], project=projects[pair % n_projects], rating=value)
+            for pair, value in zip(pairs[start:start + BATCH_SIZE].tolist(), values[start:start + BATCH_SIZE].tolist())
+        ])
+    RatingsVersion.bump()
+    return np.array([user.pk for user in users])
+
+
+def _bulk_tag(through, field, objects, interests, rng):
+    rows = []
+    for obj in objects:
+        for interest in rng.choice(len(interests), 2, replace=False).tolist():
+            rows.append(through(**{field: obj.pk, 'interest_id': interests[interest].pk}))
+    through.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def _get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,79 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from surprise import SVD
+
+from projects.content import build_content_arrays, build_interest_arrays
+from projects.evaluation import BASELINE, split_ratings, prepare, evaluate
+from projects.models import Rating
+from projects.recommendation import load_ratings
+
+DEFAULT_CONFIGS = (
+    'n_factors=50,n_epochs=20,reg_all=0.02',
+    'n_factors=100,n_epochs=20,reg_all=0.02',
+    'n_factors=20,n_epochs=30,reg_all=0.05',
+)
+
+
+def parse_config(value):
+    config = {}
+    for item in value.split(','):
+        name, _, number = item.partition('=')
+        try:
+            config[name.strip()] = int(number) if number.strip().isdigit() else float(number)
+        except ValueError:
+            raise CommandError(f'Некорректный параметр конфигурации: {item}')
+    try:
+        SVD(**config)
+    except TypeError as e:
+        raise CommandError(f'Некорректная конфигурация {value}: {e}')
+    return config
+
+
+class Command(BaseCommand):
+    help = 'Оценивает конфигурации модели рекомендаций на отложенных по времени рейтингах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--config', action='append', dest='configs',
+                            help='Параметры SVD через запятую, например n_factors=50,n_epochs=20,reg_all=0.02')
+        parser.add_argument('--test-size', type=float, default=0.2, help='Доля последних рейтингов в тестовой выборке')
+        parser.add_argument('-k', type=int, default=10, help='Длина списка рекомендаций для precision@k и recall@k')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Число процессов')
+        parser.add_argument('--output', help='Файл для результатов в формате JSON')
+
+    def handle(self, *args, **options):
+        if not 0 < options['test_size'] < 1:
+            raise CommandError('Доля тестовой выборки должна быть между 0 и 1')
+        if options['k'] < 1 or options['workers'] < 1:
+            raise CommandError('Параметры должны быть положительными')
+        configs = [parse_config(value) for value in options['configs'] or DEFAULT_CONFIGS] + [BASELINE]
+        train, test = split_ratings(*load_ratings(Rating.objects.all(), ordered=True), options['test_size'])
+        if not len(train[2]) or not len(test[2]):
+            raise CommandError('Недостаточно рейтингов для оценки')
+        item_ids = np.unique(np.concatenate([train[1], test[1]])).astype(np.int64)
+        content = build_content_arrays(item_ids)
+        content.update(build_interest_arrays(content['interest_ids']))
+        prepare(train, test, item_ids, content)
+        with ProcessPoolExecutor(max_workers=min(options['workers'], len(configs)),
+                                 mp_context=multiprocessing.get_context('fork')) as executor:
+            results = list(executor.map(partial(evaluate, k=options['k']), configs))
+        for result in results:
+            self.stdout.write(' '.join(f'{name}={_format(value)}' for name, value in result.items()))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'train_size': len(train[2]), 'test_size': len(test[2]), 'k': options['k'],
+                           'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f'{value:.4f}'
+    if isinstance(value, dict):
+        return ','.join(f'{name}={number}' for name, number in value.items())
+    return str(value)
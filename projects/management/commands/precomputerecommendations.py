@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+from collections import defaultdict
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from account.models import User
+from projects.artifacts import load_model
+from projects.models import RecommendedProject, FoldedUserFactors
+from projects.recommendation import predict_ratings, get_candidate_ids
+
+
+def _predict_chunk(users, candidates):
+    model = load_model()
+    return [(user_id, iid, est) for user_id, folded, interests in users
+            for iid, est in predict_ratings(model, user_id, folded, candidates, interests=interests)]
+
+
+class Command(BaseCommand):
+    help = 'Рассчитывает рекомендации для всех пользователей по опубликованной модели'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Число процессов')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Число пользователей в одной задаче')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пакета вставки')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['chunk_size'] < 1 or options['batch_size'] < 1:
+            raise CommandError('Параметры должны быть положительными')
+        model = load_model()
+        if model is None:
+            raise CommandError('Модель рекомендаций ещё не опубликована')
+        folded = {factors.user_id: factors.as_arrays()
+                  for factors in FoldedUserFactors.objects.filter(factors_version=model.factors_version)}
+        interests = defaultdict(list)
+        for user_id, interest_id in User.interests.through.objects.values_list('user_id', 'interest_id'):
+            interests[user_id].append(interest_id)
+        users = [(user_id, folded.get(user_id), interests[user_id])
+                 for user_id in User.objects.order_by('id').values_list('id', flat=True)]
+        chunks = [users[i:i + options['chunk_size']] for i in range(0, len(users), options['chunk_size'])]
+        predict_chunk = partial(_predict_chunk, candidates=get_candidate_ids())
+        total = 0
+        with ProcessPoolExecutor(max_workers=options['workers'],
+                                 mp_context=multiprocessing.get_context('fork')) as executor:
+            for rows in executor.map(predict_chunk, chunks):
+                with transaction.atomic():
+                    RecommendedProject.objects.bulk_create(
+                        [RecommendedProject(user_id=user_id, project_id=iid, score=est, model_version=model.version)
+                         for user_id, iid, est in rows],
+                        batch_size=options['batch_size'],
+                        ignore_conflicts=True
+                    )
+                total += len(rows)
+        RecommendedProject.objects.exclude(model_version=model.version).delete()
+        self.stdout.write(self.style.SUCCESS(f'Stored {total} recommendations for {len(users)} users'))
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.recommendation import retrain_if_stale
+
+
+class Command(BaseCommand):
+    help = 'Переобучает модель рекомендаций и публикует её для веб-процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Работать в цикле, проверяя изменения рейтингов')
+        parser.add_argument('--interval', type=int, default=None,
+                            help='Период проверки в секундах (по умолчанию RECOMMENDATION_STALENESS_BUDGET)')
+        parser.add_argument('--precompute', action='store_true',
+                            help='Рассчитывать рекомендации всех пользователей после публикации модели')
+        parser.add_argument('--ensemble', action='store_true',
+                            help='Обучать несколько моделей параллельно и публиковать лучшую или их ансамбль')
+        parser.add_argument('--force', action='store_true',
+                            help='Переобучить модель, не дожидаясь RECOMMENDATION_RETRAIN_INTERVAL')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.RECOMMENDATION_STALENESS_BUDGET
+        if interval <= 0:
+            raise CommandError('Период проверки должен быть положительным')
+        while True:
+            if retrain_if_stale(force=options['force'],
+                                ensemble=options['ensemble'] or settings.RECOMMENDATION_ENSEMBLE):
+                self.stdout.write(self.style.SUCCESS('Published new recommendation model'))
+                if options['precompute']:
+                    call_command('precomputerecommendations', stdout=self.stdout)
+            else:
+                self.stdout.write('Recommendation model is up to date')
+            if not options['loop']:
+                break
+            time.sleep(interval)
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+def create_ratings_version(apps, schema_editor):
+    RatingsVersion = apps.get_model('projects', 'RatingsVersion')
+    RatingsVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_alter_rating_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingsVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_ratings_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_ratingsversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendedProject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('model_version', models.CharField(max_length=64)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='projects.project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_projects', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'model_version', '-score'], name='recommended_project_rank_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recommendedproject',
+            constraint=models.UniqueConstraint(fields=('user', 'model_version', 'project'), name='unique_recommended_project'),
+        ),
+    ]
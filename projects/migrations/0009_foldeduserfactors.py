@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_recommendedproject'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FoldedUserFactors',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('factors_version', models.CharField(max_length=64)),
+                ('bias', models.FloatField()),
+                ('factors', models.BinaryField()),
+                ('rated_projects', models.BinaryField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='folded_factors', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_user_avatar'),
+        ('projects', '0009_foldeduserfactors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['status', 'application_deadline'], name='project_candidate_idx'),
+        ),
+    ]
@@ -1,13 +1,44 @@
+import numpy as np
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 from django.db import models
-from django.db.models import Avg
+from django.db.models import Avg, F, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 
 from account.models import Interest, User
 
 
+def count_subquery(queryset, field):
+    return Coalesce(Subquery(queryset.order_by().values(field).annotate(count=Count('pk')).values('count')), 0)
+
+
+class ProjectQuerySet(models.QuerySet):
+    def with_stats(self, user=None, fields=None):
+        participants = Project.participants.field.model.objects.filter(project=OuterRef('pk'))
+        checkpoints = Project.checkpoints.field.model.objects.filter(project=OuterRef('pk'))
+        ratings = Rating.objects.filter(project=OuterRef('pk'))
+        stats = {
+            'vacancies_num': count_subquery(participants.filter(participant=None), 'project'),
+            'checkpoints_num': count_subquery(checkpoints, 'project'),
+            'participants_num': count_subquery(participants, 'project'),
+            'mean_rating': Subquery(ratings.order_by().values('project').annotate(avg=Avg('rating')).values('avg')),
+        }
+        if user is not None:
+            stats['my_rating'] = Subquery(ratings.filter(user=user).values('rating')[:1])
+        if fields is None:
+            return self.annotate(**stats).prefetch_related('tags')
+        queryset = self.alias(**{name: value for name, value in stats.items() if name not in fields}).annotate(
+            **{name: value for name, value in stats.items() if name in fields})
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        return queryset
+
+    def with_expansions(self, expand):
+        return self.prefetch_related(*expand)
+
+
 class Project(models.Model):
     ACTIVE = "AC"
     COMPLETED = "CO"
@@ -30,6 +61,13 @@ class Project(models.Model):
     status = models.CharField(max_length=2, choices=STATUS_CHOICES, default=VACANT)
     tags = models.ManyToManyField(Interest, related_name='projects')
 
+    objects = ProjectQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'application_deadline'], name='project_candidate_idx'),
+        ]
+
     def mean_rating(self):
         return self.ratings.all().aggregate(mean_rating=Avg('rating'))['mean_rating']
 
@@ -54,3 +92,51 @@ class Rating(models.Model):
         MaxValueValidator(5),
         MinValueValidator(0)
     ])
+
+
+class RatingsVersion(models.Model):
+    version = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(version=F('version') + 1):
+            _, created = cls.objects.get_or_create(pk=1, defaults={'version': 1})
+            if not created:
+                cls.objects.filter(pk=1).update(version=F('version') + 1)
+
+
+class RecommendedProject(models.Model):
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='recommended_projects')
+    project = models.ForeignKey(Project,
+                                on_delete=models.CASCADE,
+                                related_name='recommendations')
+    score = models.FloatField()
+    model_version = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'model_version', 'project'], name='unique_recommended_project')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'model_version', '-score'], name='recommended_project_rank_idx')
+        ]
+
+
+class FoldedUserFactors(models.Model):
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                related_name='folded_factors')
+    factors_version = models.CharField(max_length=64)
+    bias = models.FloatField()
+    factors = models.BinaryField()
+    rated_projects = models.BinaryField()
+
+    def as_arrays(self):
+        return (np.frombuffer(self.factors, dtype=np.float32), self.bias,
+                np.frombuffer(self.rated_projects, dtype=np.int64))
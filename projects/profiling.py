@@ -0,0 +1,91 @@
+import functools
+import gc
+import logging
+import resource
+import time
+import tracemalloc
+
+from django.conf import settings
+
+logger = logging.getLogger('projects.recommendation')
+
+_stats = {}
+_stack = []
+
+
+def profiled(stage):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.RECOMMENDATION_PROFILING:
+                return func(*args, **kwargs)
+            with _Stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        current, peak = tracemalloc.get_traced_memory()
+        if _stack:
+            _stack[-1].peak = max(_stack[-1].peak, peak)
+        tracemalloc.reset_peak()
+        _stack.append(self)
+        self.memory = current
+        self.peak = current
+        self.objects = _count_objects()
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        _stack.pop()
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        if _stack:
+            _stack[-1].peak = max(_stack[-1].peak, self.peak)
+        peak_bytes = self.peak - self.memory
+        objects = None if self.objects is None else _count_objects() - self.objects
+        if self.started_tracing:
+            tracemalloc.stop()
+        stats = _stats.setdefault(self.name, {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                                              'max_peak_bytes': 0})
+        stats['calls'] += 1
+        stats['total_seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        stats['max_peak_bytes'] = max(stats['max_peak_bytes'], peak_bytes)
+        stats['last'] = {'seconds': seconds, 'peak_bytes': peak_bytes, 'objects': objects}
+        if objects is None:
+            logger.info('%s: %.3fs, peak %d bytes', self.name, seconds, peak_bytes)
+        else:
+            logger.info('%s: %.3fs, peak %d bytes, %+d objects', self.name, seconds, peak_bytes, objects)
+
+
+def _count_objects():
+    if not settings.RECOMMENDATION_PROFILING_OBJECTS:
+        return None
+    return len(gc.get_objects())
+
+
+def get_stats(model):
+    return {
+        'enabled': settings.RECOMMENDATION_PROFILING,
+        'model': None if model is None else {
+            'version': model.version,
+            'n_users': len(model.user_ids),
+            'n_items': len(model.item_ids),
+            'nbytes': model.nbytes,
+        },
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'traced_bytes': tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        'stages': _stats,
+    }
+
+
+def reset_stats():
+    _stats.clear()
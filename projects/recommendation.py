@@ -1,62 +1,447 @@
-import hashlib
-import pickle
+import datetime
+import multiprocessing
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
-import pandas as pd
-from django.db.models import Value, When, Case, FloatField
-from surprise import Reader, Dataset, SVD
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q, Exists, OuterRef, Count
+from surprise import SVD, BaselineOnly, Trainset
 
-from projects.models import Rating, Project
+from account.models import User
+from applications.models import Application
+from participants.models import Participant
+from projects.artifacts import load_model, publish, arrays_from_svd, get_current_version, reindex_items, \
+    empty_arrays, publish_lock, combine_arrays, predict_pairs
+from projects.content import get_catalogue_version, get_project_ids, build_content_arrays
+from projects.models import Rating, Project, RatingsVersion, RecommendedProject, FoldedUserFactors
+from projects.profiling import profiled
+from projects.similarity import build_ann_arrays, find_candidates, cosine_similarities
 
-from django.core.cache import cache
+RATING_SCALE = (0, 5)
+ALGORITHMS = {'svd': SVD, 'baseline': BaselineOnly}
+
+_ensemble_data = {}
 
 
+@profiled('recommend')
 def recommend_projects(user):
-    ratings = Rating.objects.all()
-    data_hash = hashlib.md5(pickle.dumps(list(ratings))).hexdigest()
-    cached_data = cache.get('data_hash')
-    cached_model = cache.get('recommendation_model')
-    train_set = prepare_trainset(ratings)
-    if cached_data == data_hash and cached_model is not None:
-        model = cached_model
+    model_version = get_current_version()
+    if model_version is None:
+        return Project.objects.none()
+    if not RecommendedProject.objects.filter(user=user, model_version=model_version).exists():
+        pred = get_recommendations(user)
+        if not pred:
+            return Project.objects.none()
+        store_recommendations(user, model_version, pred)
+    return get_projects_queryset(user, model_version)
+
+
+@profiled('store')
+def store_recommendations(user, model_version, pred):
+    with transaction.atomic():
+        RecommendedProject.objects.filter(user=user).exclude(model_version=model_version).delete()
+        RecommendedProject.objects.bulk_create(
+            [RecommendedProject(user_id=user, project_id=iid, score=est, model_version=model_version)
+             for iid, est in pred],
+            ignore_conflicts=True
+        )
+
+
+@profiled('recommendations')
+def get_recommendations(user):
+    model = load_model()
+    if model is None:
+        return []
+    key = get_recommendations_cache_key(model.version, user)
+    pred = cache.get(key)
+    if pred is None:
+        pred = predict_ratings(model, user, get_folded_factors(model, user), get_candidate_ids(),
+                               interests=get_user_interests(user))
+        cache.set(key, pred, settings.RECOMMENDATION_CACHE_TIMEOUT)
+    return pred
+
+
+def get_candidate_projects():
+    return Project.objects.exclude(status=Project.COMPLETED).filter(
+        Exists(Participant.objects.filter(project=OuterRef('pk'), participant=None)),
+        application_deadline__gte=datetime.date.today()
+    )
+
+
+@profiled('candidates')
+def get_candidate_ids():
+    return np.array(get_candidate_projects().order_by('id').values_list('id', flat=True), dtype=np.int64)
+
+
+def get_recommendations_cache_key(model_version, user):
+    return f'recommendations:{model_version}:{user}'
+
+
+def invalidate_recommendations(user):
+    model_version = get_current_version()
+    if model_version is not None:
+        cache.delete(get_recommendations_cache_key(model_version, user))
+    RecommendedProject.objects.filter(user=user).delete()
+
+
+def update_user_recommendations(user):
+    fold_in_user(user)
+    invalidate_recommendations(user)
+
+
+@profiled('fold_in')
+def fold_in_user(user):
+    model = load_model()
+    if model is None or not User.objects.filter(pk=user).exists():
+        return
+    ratings = np.array(Rating.objects.filter(user=user).values_list('project_id', 'rating'),
+                       dtype=np.int64).reshape(-1, 2)
+    rows = model.item_rows(ratings[:, 0])
+    values = ratings[np.isin(ratings[:, 0], model.item_ids[rows]), 1]
+    row = model.user_row(user)
+    if row is None:
+        pu, bu = np.zeros(model.qi.shape[1]), 0.0
+    else:
+        pu, bu = model.pu[row], model.bu[row]
+    pu, bu = fold_in(model, rows, values, pu, bu)
+    FoldedUserFactors.objects.update_or_create(user_id=user, defaults={
+        'factors_version': model.factors_version,
+        'bias': bu,
+        'factors': pu.tobytes(),
+        'rated_projects': ratings[:, 0].tobytes(),
+    })
+
+
+def fold_in(model, rows, values, pu, bu):
+    lr = settings.RECOMMENDATION_FOLD_IN_LR
+    reg = settings.RECOMMENDATION_FOLD_IN_REG
+    qi = model.qi[rows].astype(np.float64)
+    errors_base = values - model.global_mean - model.bi[rows]
+    pu = np.array(pu, dtype=np.float64)
+    bu = float(bu)
+    order = np.arange(len(rows))
+    rng = np.random.default_rng(0)
+    for _ in range(settings.RECOMMENDATION_FOLD_IN_EPOCHS):
+        rng.shuffle(order)
+        for j in order:
+            err = errors_base[j] - bu - qi[j] @ pu
+            bu += lr * (err - reg * bu)
+            pu += lr * (err * qi[j] - reg * pu)
+    return pu.astype(np.float32), bu
+
+
+def get_user_interests(user):
+    return np.array(User.interests.through.objects.filter(user_id=user).values_list('interest_id', flat=True),
+                    dtype=np.int64)
+
+
+def get_folded_factors(model, user):
+    folded = FoldedUserFactors.objects.filter(user=user, factors_version=model.factors_version).first()
+    return None if folded is None else folded.as_arrays()
+
+
+def retrain_if_stale(force=False, ensemble=False):
+    with publish_lock() as acquired:
+        if not acquired:
+            return False
+        return _retrain_if_stale(force, ensemble)
+
+
+def _retrain_if_stale(force, ensemble):
+    ratings_version = RatingsVersion.current()
+    catalogue_version = get_catalogue_version()
+    model = load_model()
+    retrain = force or model is None or model.ratings_version != ratings_version and \
+        time.time() - model.trained >= settings.RECOMMENDATION_RETRAIN_INTERVAL
+    if not retrain and model.catalogue_version == catalogue_version:
+        return False
+    item_ids = get_project_ids()
+    if not len(item_ids):
+        return False
+    if retrain:
+        arrays, meta = train_arrays(Rating.objects.all(), ensemble)
+    else:
+        arrays, meta = model.collaborative_arrays()
+        ratings_version = model.ratings_version
+    try:
+        arrays = build_artifact_arrays(arrays, item_ids)
+    except ValueError:
+        arrays, meta = train_arrays(Rating.objects.all(), ensemble)
+        ratings_version = RatingsVersion.current()
+        arrays = build_artifact_arrays(arrays, item_ids)
+    publish(arrays, meta, ratings_version, catalogue_version)
+    return True
+
+
+@profiled('artifacts')
+def build_artifact_arrays(arrays, item_ids):
+    arrays = reindex_items(arrays, item_ids)
+    arrays.update(build_content_arrays(item_ids))
+    arrays.update(build_ann_arrays(arrays['qi']))
+    return arrays
+
+
+@profiled('training')
+def train_arrays(ratings, ensemble=False):
+    if not ratings.exists():
+        return empty_arrays(), {'global_mean': float(np.mean(RATING_SCALE)), 'rating_scale': list(RATING_SCALE)}
+    if ensemble:
+        return train_ensemble(*load_ratings(ratings))
+    return arrays_from_svd(train_model(prepare_trainset(ratings)))
+
+
+@profiled('ensemble')
+def train_ensemble(user_ids, project_ids, values, configs=None):
+    configs = configs or settings.RECOMMENDATION_ENSEMBLE_CONFIGS
+    validation = np.random.default_rng(0).random(len(values)) < settings.RECOMMENDATION_VALIDATION_SIZE
+    errors = None
+    if validation.any() and not validation.all():
+        _ensemble_data['train'] = (user_ids[~validation], project_ids[~validation], values[~validation])
+        _ensemble_data['validation'] = (user_ids[validation], project_ids[validation])
+        predictions = np.array(_map_configs(_fit_and_predict, configs))
+        weights, errors = choose_weights(predictions, values[validation])
     else:
-        model = train_model(train_set)
-    pred = predict_ratings(model, train_set, user)
-    cache.set("data_hash", data_hash)
-    cache.set("recommendation_model", model)
-    return get_projects_queryset(pd.DataFrame(pred))
+        weights = np.eye(len(configs))[0]
+    selected = np.flatnonzero(weights)
+    _ensemble_data['train'] = (user_ids, project_ids, values)
+    fitted = _map_configs(_fit, [configs[i] for i in selected])
+    arrays = combine_arrays([arrays for arrays, _ in fitted], weights[selected])
+    meta = dict(fitted[0][1], ensemble=[
+        {'config': configs[i], 'weight': float(weights[i]), 'rmse': None if errors is None else float(errors[i])}
+        for i in range(len(configs))
+    ])
+    return arrays, meta
+
+
+def choose_weights(predictions, values):
+    errors = _rmse(predictions, values)
+    counts = np.zeros(len(predictions))
+    counts[np.argmin(errors)] = 1
+    total = predictions[np.argmin(errors)].copy()
+    best_error = errors.min()
+    for _ in range(2 * len(predictions)):
+        candidate_errors = _rmse((total + predictions) / (counts.sum() + 1), values)
+        best = np.argmin(candidate_errors)
+        if candidate_errors[best] >= best_error:
+            break
+        counts[best] += 1
+        total += predictions[best]
+        best_error = candidate_errors[best]
+    return counts / counts.sum(), errors
+
+
+def _rmse(predictions, values):
+    return np.sqrt(np.mean((np.clip(predictions, *RATING_SCALE) - values) ** 2, axis=-1))
+
+
+def _map_configs(func, configs):
+    with ProcessPoolExecutor(max_workers=min(settings.RECOMMENDATION_TRAINING_WORKERS, len(configs)),
+                             mp_context=multiprocessing.get_context('fork')) as executor:
+        return list(executor.map(func, configs))
+
+
+def _fit(config):
+    params = dict(config)
+    model = ALGORITHMS[params.pop('algorithm', 'svd')](**params)
+    model.fit(build_trainset(*_ensemble_data['train']))
+    return arrays_from_svd(model)
+
+
+def _fit_and_predict(config):
+    arrays, meta = _fit(config)
+    return predict_pairs(arrays, meta['global_mean'], *_ensemble_data['validation'])
+
+
+@profiled('loading')
+def load_ratings(ratings, chunk_size=None, ordered=False):
+    chunk_size = chunk_size or settings.RECOMMENDATION_LOAD_CHUNK_SIZE
+    size = ratings.count()
+    user_ids = np.empty(size, dtype=np.int32)
+    project_ids = np.empty(size, dtype=np.int32)
+    values = np.empty(size, dtype=np.int8)
+    n = 0
+    chunk = []
+    ratings = ratings.order_by('id') if ordered else ratings.order_by()
+    rows = ratings.values_list('user_id', 'project_id', 'rating').iterator(chunk_size=chunk_size)
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            user_ids, project_ids, values, n = _store_chunk(chunk, user_ids, project_ids, values, n)
+            chunk = []
+    if chunk:
+        user_ids, project_ids, values, n = _store_chunk(chunk, user_ids, project_ids, values, n)
+    return user_ids[:n], project_ids[:n], values[:n]
+
+
+def _store_chunk(chunk, user_ids, project_ids, values, n):
+    if n + len(chunk) > len(user_ids):
+        size = max(n + len(chunk), 2 * len(user_ids))
+        user_ids, project_ids, values = (np.resize(x, size) for x in (user_ids, project_ids, values))
+    user_ids[n:n + len(chunk)], project_ids[n:n + len(chunk)], values[n:n + len(chunk)] = zip(*chunk)
+    return user_ids, project_ids, values, n + len(chunk)
+
+
+@profiled('trainset')
+def build_trainset(user_ids, project_ids, values):
+    raw_uids, inner_uids = np.unique(user_ids, return_inverse=True)
+    raw_iids, inner_iids = np.unique(project_ids, return_inverse=True)
+    ur = defaultdict(list)
+    ir = defaultdict(list)
+    for uid, iid, r in zip(inner_uids.tolist(), inner_iids.tolist(), values.astype(float).tolist()):
+        ur[uid].append((iid, r))
+        ir[iid].append((uid, r))
+    return Trainset(ur, ir, len(raw_uids), len(raw_iids), len(values), RATING_SCALE,
+                    {raw: inner for inner, raw in enumerate(raw_uids.tolist())},
+                    {raw: inner for inner, raw in enumerate(raw_iids.tolist())})
 
 
 def prepare_trainset(ratings):
-    ratings_df = pd.DataFrame(list(ratings.values()), columns=['user_id', 'project_id', 'rating'])
-    reader = Reader(rating_scale=(0, 5))
-    data = Dataset.load_from_df(ratings_df, reader)
-    train_set = data.build_full_trainset()
-    return train_set
+    return build_trainset(*load_ratings(ratings))
 
 
+@profiled('svd_fit')
 def train_model(train_set):
     svd = SVD()
     svd.fit(train_set)
     return svd
 
 
-def predict_ratings(model, train_set, user):
-    anti_testset_user = [(uid, iid, r_ui) for uid, iid, r_ui in train_set.build_anti_testset() if uid == user]
-    predictions = model.test(anti_testset_user)
-    pred = pd.DataFrame(predictions)
-    return pred
+def get_user_factors(model, user, folded=None):
+    if folded is not None:
+        pu, bu, rated_projects = folded
+        return pu, bu, model.item_rows(rated_projects)
+    row = model.user_row(user)
+    if row is None:
+        return None, 0.0, np.empty(0, dtype=np.int32)
+    return model.pu[row], model.bu[row], model.user_rated_items(row)
 
 
-def get_projects_queryset(pred):
-    if 'iid' not in pred:
-        return Project.objects.none()
-    projects = Project.objects.filter(pk__in=pred['iid'])
-    ratings = {}
-    for x in pred[['iid', 'est']].to_dict('records'):
-        ratings[x['iid']] = x['est']
-    conditions = [When(id=key, then=Value(value)) for key, value in ratings.items()]
-    return projects.annotate(expected_rating=Case(
-        *conditions,
-        default=Value(None),
-        output_field=FloatField()
-    )).order_by('-expected_rating')
+@profiled('scoring')
+def predict_ratings(model, user, folded=None, candidates=None, n=None, interests=None):
+    pu, bu, rated = get_user_factors(model, user, folded)
+    columns = model.interest_columns(get_user_interests(user) if interests is None else interests)
+    n_interests = len(columns)
+    if pu is None and n_interests == 0:
+        return []
+    rows = np.arange(len(model.item_ids)) if candidates is None else model.item_rows(candidates)
+    rows = rows[~np.isin(rows, rated)]
+    scores = model.global_mean + model.bi[rows]
+    n_rated = len(rated)
+    if pu is not None:
+        scores = scores + bu + model.qi[rows] @ pu
+    np.clip(scores, *model.rating_scale, out=scores)
+    if n_interests:
+        low, high = model.rating_scale
+        overlap = np.asarray(model.tags_matrix[rows][:, columns].sum(axis=1)).ravel()
+        content_scores = low + (high - low) * overlap / n_interests
+        weight = n_rated / (n_rated + settings.RECOMMENDATION_COLD_START_SHRINKAGE)
+        scores = weight * scores + (1 - weight) * content_scores
+        if pu is None:
+            scores[overlap == 0] = -np.inf
+    top = select_top_n(scores, n or settings.RECOMMENDATION_TOP_N)
+    return list(zip(model.item_ids[rows[top]].tolist(), scores[top].tolist()))
+
+
+@profiled('similar')
+def get_similar_projects(project_id, n=None, queryset=None):
+    model = load_model()
+    if model is None:
+        return []
+    project_ids = [iid for iid, _ in predict_similar(model, project_id, n)]
+    projects = (Project.objects if queryset is None else queryset).in_bulk(project_ids)
+    return [projects[iid] for iid in project_ids if iid in projects]
+
+
+def predict_similar(model, project_id, n=None):
+    row = model.item_row(project_id)
+    if row is None:
+        return []
+    vector = np.asarray(model.qi[row])
+    if np.any(vector):
+        candidates = find_candidates(model.ann_planes, model.ann_codes, model.ann_order, vector)
+        candidates = candidates[candidates != row]
+        scores = cosine_similarities(model.qi[candidates], vector)
+    else:
+        tags = model.tags_matrix[row]
+        overlap = (model.tags_matrix @ tags.T).toarray().ravel()
+        candidates = np.flatnonzero(overlap)
+        candidates = candidates[candidates != row]
+        scores = overlap[candidates] / max(tags.nnz, 1)
+    top = select_top_n(scores, n or settings.RECOMMENDATION_SIMILAR_N)
+    return list(zip(model.item_ids[candidates[top]].tolist(), scores[top].tolist()))
+
+
+def suggest_candidates(participant, n=None):
+    if participant.participant_id is not None:
+        return []
+    return suggest_project_candidates(participant.project, n)
+
+
+@profiled('vacancy_candidates')
+def suggest_project_candidates(project, n=None):
+    model = load_model()
+    if model is None:
+        return []
+    excluded = set(Participant.objects.filter(project=project, participant__isnull=False)
+                   .values_list('participant_id', flat=True))
+    excluded.update(Application.objects.filter(vacancy__project=project).values_list('applicant_id', flat=True))
+    excluded.add(project.creator_id)
+    tag_ids = list(project.tags.values_list('id', flat=True))
+    pred = predict_candidates(model, project.pk, tag_ids, np.array(sorted(excluded), dtype=np.int64), n)
+    users = User.objects.in_bulk([user_id for user_id, _ in pred])
+    candidates = []
+    for user_id, score in pred:
+        if user_id in users:
+            users[user_id].match_score = score
+            candidates.append(users[user_id])
+    return candidates
+
+
+def get_interest_overlap(tag_ids):
+    rows = User.interests.through.objects.filter(interest_id__in=tag_ids).values('user_id').annotate(
+        overlap=Count('pk')
+    ).order_by('user_id').values_list('user_id', 'overlap')
+    rows = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+    return rows[:, 0], rows[:, 1]
+
+
+def predict_candidates(model, project_id, tag_ids, excluded, n=None):
+    low, high = model.rating_scale
+    interest_user_ids, interest_overlap = get_interest_overlap(tag_ids)
+    user_ids = np.union1d(interest_user_ids, model.user_ids)
+    overlap = np.zeros(len(user_ids))
+    overlap[np.searchsorted(user_ids, interest_user_ids)] = interest_overlap
+    content_scores = low + (high - low) * overlap / max(len(tag_ids), 1)
+    scores = np.where(overlap > 0, content_scores, -np.inf)
+    row = model.item_row(project_id)
+    if row is not None and len(model.user_ids):
+        positions = np.searchsorted(user_ids, model.user_ids)
+        svd_scores = model.global_mean + model.bi[row] + model.bu + model.pu @ model.qi[row]
+        np.clip(svd_scores, low, high, out=svd_scores)
+        n_rated = np.diff(model.rated_indptr)
+        weight = n_rated / (n_rated + settings.RECOMMENDATION_COLD_START_SHRINKAGE)
+        content_scores = np.where(overlap[positions] > 0, content_scores[positions], svd_scores)
+        scores[positions] = weight * svd_scores + (1 - weight) * content_scores
+    scores[np.isin(user_ids, excluded)] = -np.inf
+    top = select_top_n(scores, n or settings.RECOMMENDATION_CANDIDATES_N)
+    return list(zip(user_ids[top].tolist(), scores[top].tolist()))
+
+
+def select_top_n(scores, n):
+    candidates = np.flatnonzero(np.isfinite(scores))
+    if n < len(candidates):
+        candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def get_projects_queryset(user, model_version):
+    return Project.objects.annotate(
+        recommendation=FilteredRelation('recommendations', condition=Q(recommendations__user=user,
+                                                                         recommendations__model_version=model_version))
+    ).filter(recommendation__isnull=False, pk__in=get_candidate_projects()).annotate(
+        expected_rating=F('recommendation__score')
+    ).order_by('-expected_rating', 'pk')
@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from account.models import User
+from projects.models import Rating, RatingsVersion
+from projects.recommendation import update_user_recommendations, invalidate_recommendations
+
+RATING_USERS_ATTR = '_rating_users'
+
+_rating_signals_muted = ContextVar('rating_signals_muted', default=False)
+
+
+@contextmanager
+def mute_rating_signals():
+    # For bulk writes that bump the ratings version and update the recommendations themselves
+    token = _rating_signals_muted.set(True)
+    try:
+        yield
+    finally:
+        _rating_signals_muted.reset(token)
+
+
+@receiver([post_save, post_delete], sender=Rating)
+def ratings_changed(sender, instance, origin=None, **kwargs):
+    if _rating_signals_muted.get():
+        return
+    if origin is None or origin is instance:
+        RatingsVersion.bump()
+        transaction.on_commit(partial(update_user_recommendations, instance.user_id))
+        return
+    # Cascades and queryset deletes are batched into one bump and one update per user
+    users = getattr(origin, RATING_USERS_ATTR, None)
+    if users is None:
+        users = set()
+        setattr(origin, RATING_USERS_ATTR, users)
+        RatingsVersion.bump()
+        transaction.on_commit(partial(_update_users, users))
+    users.add(instance.user_id)
+
+
+def _update_users(users):
+    for user in sorted(users):
+        update_user_recommendations(user)
+
+
+@receiver(m2m_changed, sender=User.interests.through)
+def interests_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    users = (pk_set or ()) if reverse else [instance.pk]
+    for user in users:
+        transaction.on_commit(partial(invalidate_recommendations, user))
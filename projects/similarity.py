@@ -0,0 +1,46 @@
+import numpy as np
+
+ANN_TABLES = 8
+ANN_BUCKET_SIZE = 16
+ANN_MAX_BITS = 20
+ANN_SEED = 0
+
+
+def build_ann_arrays(qi):
+    n_items, n_factors = qi.shape
+    bits = int(np.clip(np.log2(max(n_items, 1) / ANN_BUCKET_SIZE), 1, ANN_MAX_BITS))
+    planes = np.random.default_rng(ANN_SEED).standard_normal((ANN_TABLES, bits, n_factors)).astype(np.float32)
+    codes = _hash(planes, qi)
+    order = np.argsort(codes, axis=1, kind='stable').astype(np.int32)
+    return {
+        'ann_planes': planes,
+        'ann_codes': np.take_along_axis(codes, order, axis=1),
+        'ann_order': order,
+    }
+
+
+def _hash(planes, vectors):
+    bits = planes.shape[1]
+    signs = np.einsum('tbf,nf->tnb', planes, np.atleast_2d(vectors)) > 0
+    return signs.astype(np.int64) @ (1 << np.arange(bits, dtype=np.int64))
+
+
+def find_candidates(planes, codes, order, vector):
+    bits = planes.shape[1]
+    query = _hash(planes, vector)[:, 0]
+    probes = np.concatenate([query[:, None], query[:, None] ^ (1 << np.arange(bits, dtype=np.int64))], axis=1)
+    candidates = []
+    for table in range(len(planes)):
+        starts = np.searchsorted(codes[table], probes[table], side='left')
+        ends = np.searchsorted(codes[table], probes[table], side='right')
+        candidates.extend(order[table, start:end] for start, end in zip(starts, ends) if start < end)
+    if not candidates:
+        return np.empty(0, dtype=np.int32)
+    return np.unique(np.concatenate(candidates))
+
+
+def cosine_similarities(vectors, vector):
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(vector)
+    similarities = np.full(len(vectors), -np.inf)
+    np.divide(vectors @ vector, norms, out=similarities, where=norms > 0)
+    return similarities
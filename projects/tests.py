@@ -1,12 +1,36 @@
 import datetime
-from unittest.mock import patch
-
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+from unittest.mock import Mock, call, patch
+
+import numpy as np
+
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 from django.urls import reverse
 
 from account.models import User, Interest
 from api.serializers import ProjectUpdateSerializer
-from projects.models import Project, Rating
+from applications.models import Application
+from participants.models import Participant
+from projects.artifacts import arrays_from_svd, publish, load_model, publish_lock, warm_up_model
+from projects.content import get_project_ids, get_catalogue_version
+from projects.models import Project, Rating, RatingsVersion, RecommendedProject, FoldedUserFactors
+from projects.profiling import reset_stats
+from projects.recommendation import recommend_projects, retrain_if_stale, prepare_trainset, train_model, \
+    predict_ratings, select_top_n, get_recommendations, load_ratings, get_similar_projects, build_artifact_arrays, \
+    get_candidate_ids, suggest_candidates, predict_candidates, choose_weights, train_ensemble
+from projects.similarity import build_ann_arrays, find_candidates, cosine_similarities
 
 
 class ProjectTestCase(TestCase):
@@ -305,3 +329,385 @@ class ProjectTestCase(TestCase):
         cls.user1.delete()
         cls.user2.delete()
         cls.mock_authenticate.stop()
+
+
+class RecommendationTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.user1 = User.objects.create_user(email='vlad@vk.ru')
+        cls.user2 = User.objects.create_user(email='ivan@bk.ru')
+        project_info = {
+            'description': 'Desc',
+            'application_deadline': datetime.date.today() + datetime.timedelta(days=1),
+            'completion_deadline': datetime.date.today() + datetime.timedelta(days=3),
+            'creator': cls.user2
+        }
+        cls.project1 = Project.objects.create(title='Title1', **project_info)
+        cls.project2 = Project.objects.create(title='Title2', **project_info)
+        for project in (cls.project1, cls.project2):
+            Participant.objects.create(title='Role1', description='Role1Desc', project=project)
+        Rating.objects.create(user=cls.user1, project=cls.project1, rating=5)
+        Rating.objects.create(user=cls.user2, project=cls.project1, rating=4)
+        Rating.objects.create(user=cls.user2, project=cls.project2, rating=5)
+
+    def setUp(self):
+        self.model_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(RECOMMENDATION_MODEL_DIR=self.model_dir.name)
+        self.settings_override.enable()
+        cache.clear()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.model_dir.cleanup()
+
+    def test_recommend_without_published_model(self):
+        self.assertFalse(recommend_projects(self.user1.pk).exists())
+
+    def test_train_and_recommend(self):
+        call_command('trainrecommendations', stdout=io.StringIO())
+        self.assertEqual([self.project2.pk], [x.pk for x in recommend_projects(self.user1.pk)])
+        self.assertFalse(retrain_if_stale())
+
+    def test_warm_up_model(self):
+        self.assertIsNone(warm_up_model())
+        call_command('trainrecommendations', stdout=io.StringIO())
+        model = warm_up_model()
+        self.assertIs(load_model(), model)
+        self.assertIn('tags_matrix', model.__dict__)
+
+    def test_wsgi_survives_failed_warm_up(self):
+        import studentProjects.wsgi
+        application = studentProjects.wsgi.application
+        with patch('django.core.wsgi.get_wsgi_application', return_value=application), \
+                patch('projects.artifacts.warm_up_model', side_effect=OSError), \
+                self.assertLogs('projects.recommendation', 'ERROR'):
+            importlib.reload(studentProjects.wsgi)
+        self.assertIs(application, studentProjects.wsgi.application)
+
+    def test_retrain_skipped_while_locked(self):
+        with publish_lock() as acquired:
+            self.assertTrue(acquired)
+            self.assertFalse(retrain_if_stale())
+            self.assertIsNone(load_model())
+        self.assertTrue(retrain_if_stale())
+
+    def test_benchmark_recommendations(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as f:
+            call_command('benchmarkrecommendations', '--sizes', '500', '--sample-users', '5', '--output', f.name,
+                         stdout=io.StringIO(), stderr=io.StringIO())
+            report = json.load(f)
+        result, = report['results']
+        self.assertEqual(500, result['n_ratings'])
+        self.assertEqual({'fingerprint', 'loading', 'trainset', 'training', 'publishing', 'candidates', 'scoring',
+                          'queryset'},
+                         set(result['stages']))
+        self.assertFalse(User.objects.filter(email__startswith='benchmark-').exists())
+        self.assertEqual(3, Rating.objects.count())
+
+    def test_evaluate_recommendations(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as f:
+            call_command('evaluaterecommendations', '--config', 'n_factors=2,n_epochs=5', '--test-size', '0.34',
+                         '--workers', '1', '--output', f.name, stdout=io.StringIO())
+            report = json.load(f)
+        self.assertEqual((2, 1), (report['train_size'], report['test_size']))
+        self.assertEqual([{'n_factors': 2, 'n_epochs': 5}, 'interests'], [x['config'] for x in report['results']])
+        for result in report['results']:
+            self.assertEqual(1.0, result['recall@10'])
+            self.assertEqual(0.5, result['precision@10'])
+        with self.assertRaises(CommandError):
+            call_command('evaluaterecommendations', '--config', 'n_factor=2', stdout=io.StringIO())
+
+    def test_precompute_recommendations(self):
+        call_command('trainrecommendations', '--precompute', stdout=io.StringIO())
+        model_version = load_model().version
+        rows = RecommendedProject.objects.filter(model_version=model_version)
+        self.assertEqual([(self.user1.pk, self.project2.pk)], list(rows.values_list('user_id', 'project_id')))
+        with patch('projects.recommendation.get_recommendations') as mock:
+            projects = list(recommend_projects(self.user1.pk))
+            mock.assert_not_called()
+        self.assertEqual([self.project2.pk], [x.pk for x in projects])
+        self.assertEqual(rows.get().score, projects[0].expected_rating)
+        with self.captureOnCommitCallbacks(execute=True):
+            rating = Rating.objects.create(user=self.user1, project=self.project2, rating=3)
+        self.assertFalse(RecommendedProject.objects.filter(user=self.user1).exists())
+        rating.delete()
+
+    def test_recommended_views(self):
+        call_command('trainrecommendations', stdout=io.StringIO())
+        self.client.force_login(self.user1)
+        response = self.client.get(reverse('projects:recommended_projects_list'))
+        self.assertEqual([self.project2.pk], [x.pk for x in response.context['projects']])
+        self.client.logout()
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.user1)
+        client.credentials(HTTP_HSE_AUTH=token.key)
+        response = client.get('/api/projects/recommended/', format='json')
+        self.assertEqual([self.project2.pk], [x['id'] for x in response.json()['results']])
+
+    def test_similar_projects(self):
+        call_command('trainrecommendations', stdout=io.StringIO())
+        self.assertEqual([self.project2], get_similar_projects(self.project1.pk))
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.user1)
+        client.credentials(HTTP_HSE_AUTH=token.key)
+        response = client.get(f'/api/projects/{self.project1.pk}/similar/', format='json')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([self.project2.pk], [x['id'] for x in response.json()])
+
+    def test_suggest_candidates(self):
+        interest = Interest.objects.create(title='Math')
+        user = User.objects.create_user(email='new@vk.ru')
+        user.interests.add(interest)
+        applicant = User.objects.create_user(email='applicant@vk.ru')
+        applicant.interests.add(interest)
+        self.project2.tags.add(interest)
+        vacancy = self.project2.participants.get()
+        Application.objects.create(vacancy=vacancy, applicant=applicant)
+        call_command('trainrecommendations', stdout=io.StringIO())
+        self.assertEqual([user, self.user1], suggest_candidates(vacancy))
+        self.assertEqual(5.0, suggest_candidates(vacancy)[0].match_score)
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.user2)
+        client.credentials(HTTP_HSE_AUTH=token.key)
+        response = client.get(f'/api/participants/{vacancy.pk}/candidates/', format='json')
+        self.assertEqual([user.pk, self.user1.pk], [x['id'] for x in response.json()])
+        client.credentials(HTTP_HSE_AUTH=Token.objects.get_or_create(user=self.user1)[0].key)
+        self.assertEqual(403, client.get(f'/api/participants/{vacancy.pk}/candidates/').status_code)
+        self.client.force_login(self.user2)
+        response = self.client.get(reverse('projects:participants_list', args=(self.project2.pk,)))
+        self.assertEqual([user, self.user1], response.context['participants'][0].candidates)
+        late = User.objects.create_user(email='late@vk.ru')
+        late.interests.add(interest)
+        second = Participant.objects.create(project=self.project2, title='Second', description='')
+        with patch('projects.recommendation.predict_candidates', wraps=predict_candidates) as predict:
+            response = self.client.get(reverse('projects:participants_list', args=(self.project2.pk,)))
+        predict.assert_called_once()
+        self.assertEqual([user, late, self.user1], response.context['participants'][1].candidates)
+        self.assertEqual([user, late, self.user1], suggest_candidates(second))
+        Participant.objects.filter(project=self.project2, participant__isnull=True).update(participant=late)
+        with patch('projects.recommendation.predict_candidates') as predict:
+            response = self.client.get(reverse('projects:participants_list', args=(self.project2.pk,)))
+        predict.assert_not_called()
+        self.assertEqual([[], []], [participant.candidates for participant in response.context['participants']])
+        Participant.objects.filter(project=self.project2).update(participant=None)
+        self.project2.tags.remove(interest)
+        second.delete()
+        applicant.delete()
+        late.delete()
+        user.delete()
+        interest.delete()
+
+    def test_profiling_stats(self):
+        call_command('trainrecommendations', stdout=io.StringIO())
+        reset_stats()
+        with override_settings(RECOMMENDATION_PROFILING=True), self.assertLogs('projects.recommendation') as logs:
+            get_recommendations(self.user1.pk)
+        self.assertTrue(any(line.startswith('INFO:projects.recommendation:scoring: ') for line in logs.output))
+        self.assertFalse(any(line.endswith(' objects') for line in logs.output))
+        self.assertFalse(tracemalloc.is_tracing())
+        with override_settings(RECOMMENDATION_PROFILING=True, RECOMMENDATION_PROFILING_OBJECTS=True), \
+                self.assertLogs('projects.recommendation') as logs:
+            get_recommendations(self.user1.pk)
+        self.assertTrue(all(line.endswith(' objects') for line in logs.output))
+        client = APIClient()
+        client.credentials(HTTP_HSE_AUTH=Token.objects.get_or_create(user=self.user1)[0].key)
+        self.assertEqual(403, client.get('/api/recommendations/stats/').status_code)
+        self.user1.is_staff = True
+        self.user1.save()
+        stats = client.get('/api/recommendations/stats/').json()
+        self.assertEqual({'load_model', 'recommendations', 'candidates', 'scoring'}, set(stats['stages']))
+        self.assertEqual(1, stats['stages']['scoring']['calls'])
+        self.assertGreater(stats['stages']['recommendations']['max_peak_bytes'], 0)
+        self.assertEqual(load_model().nbytes, stats['model']['nbytes'])
+        self.assertEqual(204, client.delete('/api/recommendations/stats/').status_code)
+        self.assertEqual({}, client.get('/api/recommendations/stats/').json()['stages'])
+        self.user1.is_staff = False
+        self.user1.save()
+
+    def test_choose_ensemble_weights(self):
+        values = np.array([1.0, 2.0, 3.0, 4.0])
+        weights, errors = choose_weights(np.array([values, np.full(4, 4.0)]), values)
+        self.assertEqual([1.0, 0.0], weights.tolist())
+        self.assertEqual(0.0, errors[0])
+        weights, _ = choose_weights(np.array([values + 0.5, values - 0.5]), values)
+        self.assertEqual([0.5, 0.5], weights.tolist())
+
+    @override_settings(RECOMMENDATION_VALIDATION_SIZE=0.2, RECOMMENDATION_TRAINING_WORKERS=2)
+    def test_train_ensemble(self):
+        rng = np.random.default_rng(0)
+        pairs = rng.choice(100 * 30, 1000, replace=False)
+        user_ids, project_ids = pairs // 30, pairs % 30
+        values = np.clip(np.round(user_ids % 5 + rng.normal(0, 0.5, len(pairs))), 0, 5).astype(np.int8)
+        configs = [{'n_factors': 2, 'n_epochs': 5, 'random_state': 0}, {'algorithm': 'baseline', 'verbose': False}]
+        arrays, meta = train_ensemble(user_ids, project_ids, values, configs)
+        weights = [x['weight'] for x in meta['ensemble']]
+        self.assertAlmostEqual(1.0, sum(weights))
+        self.assertTrue(all(x['rmse'] is not None for x in meta['ensemble']))
+        self.assertEqual(2 if weights[0] else 0, arrays['qi'].shape[1])
+        self.assertEqual((100, 30), (len(arrays['user_ids']), len(arrays['item_ids'])))
+
+    def test_ann_finds_nearest_item(self):
+        rng = np.random.default_rng(1)
+        qi = rng.standard_normal((20000, 20)).astype(np.float32)
+        qi[1] = qi[0] + 0.01 * rng.standard_normal(20)
+        index = build_ann_arrays(qi)
+        candidates = find_candidates(index['ann_planes'], index['ann_codes'], index['ann_order'], qi[0])
+        self.assertIn(1, candidates)
+        self.assertLess(len(candidates), len(qi) // 4)
+        similarities = cosine_similarities(qi[candidates], qi[0])
+        self.assertEqual(1, candidates[select_top_n(np.where(candidates == 0, -np.inf, similarities), 1)[0]])
+
+    def test_recommendations_cached_until_user_rates(self):
+        call_command('trainrecommendations', stdout=io.StringIO())
+        with patch('projects.recommendation.predict_ratings', return_value=[(self.project2.pk, 4.0)]) as mock:
+            get_recommendations(self.user1.pk)
+            get_recommendations(self.user1.pk)
+            self.assertEqual(1, mock.call_count)
+            with self.captureOnCommitCallbacks(execute=True):
+                rating = Rating.objects.create(user=self.user1, project=self.project2, rating=3)
+            get_recommendations(self.user1.pk)
+            self.assertEqual(2, mock.call_count)
+            rating.delete()
+
+    def test_recommend_empty_prediction_does_not_write(self):
+        call_command('trainrecommendations', stdout=io.StringIO())
+        with patch('projects.recommendation.get_recommendations', return_value=[]) as mock, \
+                CaptureQueriesContext(connection) as queries:
+            self.assertFalse(recommend_projects(self.user1.pk).exists())
+        mock.assert_called_once()
+        self.assertFalse(any(query['sql'].startswith(('DELETE', 'INSERT')) for query in queries))
+        with patch('projects.recommendation.get_recommendations',
+                   return_value=[(self.project2.pk, 4.0), (self.project1.pk, 4.0)]):
+            self.assertEqual([self.project1.pk, self.project2.pk], [x.pk for x in recommend_projects(self.user1.pk)])
+
+    def test_recommend_only_candidates(self):
+        call_command('trainrecommendations', stdout=io.StringIO())
+        self.assertEqual([self.project1.pk, self.project2.pk], get_candidate_ids().tolist())
+        Project.objects.filter(pk=self.project2.pk).update(application_deadline=datetime.date.today()
+                                                           - datetime.timedelta(days=1))
+        self.assertEqual([], predict_ratings(load_model(), self.user1.pk, candidates=get_candidate_ids()))
+        self.assertFalse(recommend_projects(self.user1.pk).exists())
+        Project.objects.filter(pk=self.project2.pk).update(application_deadline=self.project2.application_deadline)
+
+    def test_fold_in_new_rating(self):
+        call_command('trainrecommendations', stdout=io.StringIO())
+        model = load_model()
+        user = User.objects.create_user(email='new@vk.ru')
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(user=user, project=self.project1, rating=5)
+            rating = Rating.objects.create(user=self.user1, project=self.project2, rating=0)
+        folded = FoldedUserFactors.objects.get(user=self.user1)
+        self.assertEqual(model.factors_version, folded.factors_version)
+        self.assertLess(folded.bias, model.bu[model.user_row(self.user1.pk)])
+        self.assertEqual([], get_recommendations(self.user1.pk))
+        self.assertEqual([self.project2.pk], [iid for iid, _ in get_recommendations(user.pk)])
+        self.assertFalse(retrain_if_stale())
+        self.assertTrue(retrain_if_stale(force=True))
+        self.assertNotEqual(model.factors_version, load_model().factors_version)
+        rating.delete()
+        user.delete()
+
+    def test_catalogue_republish_keeps_training_time(self):
+        call_command('trainrecommendations', stdout=io.StringIO())
+        model = load_model()
+        rating = Rating.objects.create(user=self.user1, project=self.project2, rating=3)
+        project = Project.objects.create(title='Title3', description='Desc', creator=self.user2,
+                                         application_deadline=self.project1.application_deadline,
+                                         completion_deadline=self.project1.completion_deadline)
+        with override_settings(RECOMMENDATION_RETRAIN_INTERVAL=3600):
+            self.assertTrue(retrain_if_stale())
+            republished = load_model()
+            self.assertNotEqual(model.version, republished.version)
+            self.assertEqual((model.factors_version, model.trained),
+                             (republished.factors_version, republished.trained))
+            with patch('projects.recommendation.time.time', return_value=model.trained + 3600):
+                self.assertTrue(retrain_if_stale())
+            self.assertNotEqual(model.factors_version, load_model().factors_version)
+        rating.delete()
+        project.delete()
+
+    def test_publish_keeps_recent_versions(self):
+        arrays, meta = arrays_from_svd(train_model(prepare_trainset(Rating.objects.all())))
+        arrays = build_artifact_arrays(arrays, get_project_ids())
+        suffixes = iter(['f' * 32, 'e' * 32, 'd' * 32, 'c' * 32, 'b' * 32])
+        with patch('projects.artifacts.uuid.uuid4', side_effect=lambda: Mock(hex=next(suffixes))), \
+                patch('projects.artifacts.time.strftime', return_value='20240101000000'):
+            versions = [publish(arrays, meta, 1, 'catalogue') for _ in range(5)]
+        self.assertEqual(sorted(versions[2:]), sorted(name for name in os.listdir(self.model_dir.name)
+                                                      if not name.startswith('.') and name != 'CURRENT'))
+        self.assertEqual(versions[-1], load_model().version)
+        shutil.rmtree(os.path.join(self.model_dir.name, versions[-1]))
+        with patch.dict('projects.artifacts._loaded', key=None):
+            self.assertEqual(versions[-1], load_model().version)
+
+    def test_predict_ratings_matches_svd(self):
+        svd = train_model(prepare_trainset(Rating.objects.all()))
+        arrays, meta = arrays_from_svd(svd)
+        arrays = build_artifact_arrays(arrays, get_project_ids())
+        publish(arrays, meta, RatingsVersion.current(), get_catalogue_version())
+        model = load_model()
+        self.assertIsInstance(model.qi, np.memmap)
+        self.assertEqual(np.float32, model.qi.dtype)
+        pred = predict_ratings(model, self.user1.pk)
+        self.assertEqual([self.project2.pk], [iid for iid, _ in pred])
+        self.assertAlmostEqual(svd.predict(self.user1.pk, self.project2.pk).est, pred[0][1], places=4)
+        self.assertEqual([], predict_ratings(model, -1))
+
+    def test_cold_start_by_interests(self):
+        interest = Interest.objects.create(title='Math')
+        user = User.objects.create_user(email='new@vk.ru')
+        self.project1.tags.add(interest)
+        call_command('trainrecommendations', stdout=io.StringIO())
+        catalogue_version = get_catalogue_version()
+        self.assertEqual([], get_recommendations(user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            user.interests.add(interest)
+        self.assertEqual(catalogue_version, get_catalogue_version())
+        self.assertEqual([(self.project1.pk, 5.0)], get_recommendations(user.pk))
+        self.assertEqual([(self.project1.pk, 5.0)], predict_ratings(load_model(), user.pk))
+        self.project1.tags.remove(interest)
+        user.delete()
+        interest.delete()
+
+    def test_load_ratings_in_chunks(self):
+        user_ids, project_ids, values = load_ratings(Rating.objects.all(), chunk_size=2)
+        self.assertEqual((np.int32, np.int32, np.int8), (user_ids.dtype, project_ids.dtype, values.dtype))
+        expected = sorted(Rating.objects.values_list('user_id', 'project_id', 'rating'))
+        self.assertEqual(expected, sorted(zip(user_ids.tolist(), project_ids.tolist(), values.tolist())))
+        train_set = prepare_trainset(Rating.objects.all())
+        self.assertEqual(3, train_set.n_ratings)
+        self.assertEqual(2, train_set.n_items)
+        self.assertAlmostEqual(14 / 3, train_set.global_mean)
+
+    def test_select_top_n(self):
+        scores = np.array([1.0, 3.0, -np.inf, 2.0, 0.5])
+        self.assertEqual([1, 3], select_top_n(scores, 2).tolist())
+        self.assertEqual([1, 3, 0, 4], select_top_n(scores, 10).tolist())
+
+    def test_ratings_version_bumped_on_write(self):
+        version = RatingsVersion.current()
+        rating = Rating.objects.create(user=self.user1, project=self.project2, rating=3)
+        self.assertEqual(version + 1, RatingsVersion.current())
+        rating.delete()
+        self.assertEqual(version + 2, RatingsVersion.current())
+
+    def test_cascade_delete_batches_rating_updates(self):
+        project = Project.objects.create(title='Title3', description='Desc', creator=self.user2,
+                                         application_deadline=self.project1.application_deadline,
+                                         completion_deadline=self.project1.completion_deadline)
+        for user in [self.user1, self.user2]:
+            Rating.objects.create(user=user, project=project, rating=3)
+        version = RatingsVersion.current()
+        with patch('projects.signals.update_user_recommendations') as update, \
+                self.captureOnCommitCallbacks(execute=True):
+            project.delete()
+        self.assertEqual(version + 1, RatingsVersion.current())
+        self.assertEqual([call(self.user1.pk), call(self.user2.pk)], update.call_args_list)
+
+    @classmethod
+    def tearDownClass(cls):
+        Rating.objects.all().delete()
+        cls.project1.delete()
+        cls.project2.delete()
+        cls.user1.delete()
+        cls.user2.delete()
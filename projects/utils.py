@@ -0,0 +1,33 @@
+from functools import partial
+
+from django.db import transaction
+
+from projects.models import Rating, RatingsVersion
+from projects.recommendation import update_user_recommendations
+from projects.signals import mute_rating_signals
+
+
+def rate_projects(user, ratings):
+    with transaction.atomic():
+        existing = {}
+        for rating in Rating.objects.filter(user=user, project__in=list(ratings)).select_for_update():
+            existing.setdefault(rating.project_id, []).append(rating)
+        updated = []
+        for project_id, rating in ratings.items():
+            if rating is not None:
+                for obj in existing.get(project_id, []):
+                    obj.rating = rating
+                    updated.append(obj)
+        Rating.objects.bulk_update(updated, ['rating'])
+        created = Rating.objects.bulk_create([Rating(user=user, project_id=project_id, rating=rating)
+                                              for project_id, rating in ratings.items()
+                                              if rating is not None and project_id not in existing])
+        with mute_rating_signals():
+            deleted, _ = Rating.objects.filter(
+                user=user, project__in=[project_id for project_id, rating in ratings.items() if rating is None]
+            ).delete()
+        if updated or created or deleted:
+            RatingsVersion.bump()
+            transaction.on_commit(partial(update_user_recommendations, user.pk))
+    result = {rating.project_id: rating for rating in updated + created}
+    return [result[project_id] for project_id in ratings if project_id in result]
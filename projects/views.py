@@ -1,7 +1,7 @@
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.db.models import Count, Q, Avg
+from django.db.models import Avg
 from django.http import QueryDict
 from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse
@@ -14,16 +14,13 @@ from projects.filters import ProjectFilter, ProjectRecommendedFilter
 from projects.mixins import UserIsCreatorRequiredMixin
 from projects.forms import ProjectCreateForm, CheckpointFormSet, ParticipantCreateFormSet, ProjectUpdateForm, RatingForm
 from projects.models import Project, Rating
-from projects.recommendation import recommend_projects
+from projects.recommendation import recommend_projects, get_similar_projects, suggest_project_candidates
+from studentProjects.pagination import KeysetPaginationMixin
 
 
-class ProjectListView(LoginRequiredMixin, FilterView):
+class ProjectListView(LoginRequiredMixin, KeysetPaginationMixin, FilterView):
     paginate_by = 5
-    queryset = Project.objects.all().annotate(
-        vacancies_num=Count('participants', filter=Q(participants__participant=None), distinct=True),
-        checkpoints_num=Count('checkpoints', distinct=True),
-        participants_num=Count('participants', distinct=True),
-    )
+    queryset = Project.objects.with_stats()
     context_object_name = 'projects'
     template_name = 'projects/list.html'
     filterset_class = ProjectFilter
@@ -119,6 +116,7 @@ class ProjectDetailView(LoginRequiredMixin, DetailView):
         else:
             rating = str(self.object.ratings.all().get(user=self.request.user).rating)
         context['rating_form'] = RatingForm({'rating': rating})
+        context['similar_projects'] = get_similar_projects(self.object.pk)
         return context
 
 
@@ -142,6 +140,14 @@ class ParticipantsListView(LoginRequiredMixin, UserIsCreatorRequiredMixin, ListV
         context = super().get_context_data(**kwargs)
         pk = self.kwargs['pk']
         context['project'] = Project.objects.get(pk=pk)
+        candidates = None
+        for participant in context['participants']:
+            if participant.participant_id is not None:
+                participant.candidates = []
+                continue
+            if candidates is None:
+                candidates = suggest_project_candidates(context['project'])
+            participant.candidates = candidates
         return context
 
 
@@ -158,12 +164,7 @@ class RecommendedProjectListView(LoginRequiredMixin, FilterView):
         return filterset_kwargs
 
     def get_queryset(self):
-        projects = recommend_projects(self.request.user.pk).exclude(status=Project.COMPLETED).annotate(
-            vacancies_num=Count('participants', filter=Q(participants__participant=None), distinct=True),
-            checkpoints_num=Count('checkpoints', distinct=True),
-            participants_num=Count('participants', distinct=True),
-        ).distinct().filter(vacancies_num__gt=0)
-        return projects
+        return recommend_projects(self.request.user.pk).with_stats()
 
 
 class CheckpointUpdateView(LoginRequiredMixin, UserIsCreatorRequiredMixin, UpdateView):
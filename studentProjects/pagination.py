@@ -0,0 +1,146 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import F, Q
+from django.http import Http404
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, per_page, ordering=None):
+        ordering = list(ordering or queryset.query.order_by or ['pk'])
+        if not all(isinstance(field, str) for field in ordering):
+            raise ValueError('Keyset pagination supports ordering by field names only')
+        if ordering[-1].lstrip('-') not in ('pk', 'id'):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        aliases = [field.lstrip('-') for field in ordering if field.lstrip('-') in queryset.query.annotations and
+                   field.lstrip('-') not in queryset.query.annotation_select]
+        self.queryset = queryset.annotate(**{name: F(name) for name in aliases})
+        self.per_page = per_page
+        self.ordering = ordering
+        query = self.queryset.query.clone()
+        self.fields = [query.resolve_ref(field.lstrip('-')).output_field for field in ordering]
+
+    def page(self, cursor=None):
+        position, reverse = decode_cursor(cursor) if cursor else (None, False)
+        if position is not None and len(position) != len(self.ordering):
+            raise InvalidPage('Некорректный курсор')
+        ordering = [_reverse(field) for field in self.ordering] if reverse else self.ordering
+        queryset = self.queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                position = [field.to_python(value) for field, value in zip(self.fields, position)]
+                queryset = queryset.filter(_after(ordering, position))
+            except (ValidationError, ValueError, TypeError):
+                raise InvalidPage('Некорректный курсор')
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if reverse:
+            object_list.reverse()
+            return KeysetPage(object_list, self, has_next=position is not None, has_previous=has_more)
+        return KeysetPage(object_list, self, has_next=has_more, has_previous=position is not None)
+
+    def position(self, obj):
+        return [_serialize(getattr(obj, field.lstrip('-'))) for field in self.ordering]
+
+
+class KeysetPage:
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(self.paginator.position(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(self.paginator.position(self.object_list[0]), reverse=True)
+
+    @property
+    def last_cursor(self):
+        return encode_cursor(None, reverse=True)
+
+
+def encode_cursor(position, reverse=False):
+    data = json.dumps({'p': position, 'r': reverse}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        position, reverse = data['p'], bool(data['r'])
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        raise InvalidPage('Некорректный курсор')
+    if position is not None and (not isinstance(position, list) or
+                                 not all(value is None or isinstance(value, (bool, int, float, str))
+                                         for value in position)):
+        raise InvalidPage('Некорректный курсор')
+    return position, reverse
+
+
+def _serialize(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def _reverse(field):
+    return field[1:] if field.startswith('-') else '-' + field
+
+
+def _after(ordering, position):
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    name = ordering[0].lstrip('-')
+    bound = Q(**{f"{name}__{'lte' if ordering[0].startswith('-') else 'gte'}": position[0]})
+    return bound & condition
+
+
+class KeysetPaginationMixin:
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.cursor_kwarg not in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET[self.cursor_kwarg])
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -154,6 +154,15 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.BasicAuthentication',
         'account.authentication.HSETokenAuthentication',
@@ -161,4 +170,69 @@ REST_FRAMEWORK = {
 }
 
 AUTH_USER_MODEL = 'account.User'
+
+# Several gunicorn workers need a shared backend (e.g. FileBasedCache) to see each other's invalidations
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get("CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get("CACHE_LOCATION", ''),
+    }
+}
+
+# Recommendation model is trained by the `trainrecommendations` command and published into this directory
+RECOMMENDATION_MODEL_DIR = os.environ.get("RECOMMENDATION_MODEL_DIR", os.path.join(BASE_DIR, 'recommendation_models'))
+# Polling period in seconds of `trainrecommendations --loop`, how often new ratings and catalogue changes are
+# folded in or published, full retraining is limited by RECOMMENDATION_RETRAIN_INTERVAL
+RECOMMENDATION_STALENESS_BUDGET = int(os.environ.get("RECOMMENDATION_STALENESS_BUDGET", default=60))
+# Minimum age in seconds of the published factors before new ratings trigger a full retrain,
+# in between new ratings are folded into the user factors
+RECOMMENDATION_RETRAIN_INTERVAL = int(os.environ.get("RECOMMENDATION_RETRAIN_INTERVAL", default=60 * 60))
+# SGD parameters used to fold new ratings into the user factors against the frozen item factors
+RECOMMENDATION_FOLD_IN_EPOCHS = 20
+RECOMMENDATION_FOLD_IN_LR = 0.01
+RECOMMENDATION_FOLD_IN_REG = 0.02
+# Number of best scored projects kept for every user
+RECOMMENDATION_TOP_N = 100
+# Ranked recommendations of every user are cached per model version
+RECOMMENDATION_CACHE_TIMEOUT = 60 * 60 * 24
+# Ratings are streamed from a server-side cursor in chunks of this size during training
+RECOMMENDATION_LOAD_CHUNK_SIZE = 10000
+# Number of own ratings at which collaborative and interest-based scores are weighted equally
+RECOMMENDATION_COLD_START_SHRINKAGE = 5
+# Number of projects shown in the "similar projects" block
+RECOMMENDATION_SIMILAR_N = 5
+# Number of users suggested as candidates for an open vacancy
+RECOMMENDATION_CANDIDATES_N = 10
+# Models fitted in parallel by `trainrecommendations --ensemble`, the published model is a weighted ensemble
+# of them selected greedily by the error on a random validation split
+RECOMMENDATION_ENSEMBLE = os.environ.get("RECOMMENDATION_ENSEMBLE", default="0") == "1"
+RECOMMENDATION_ENSEMBLE_CONFIGS = [
+    {'algorithm': 'svd', 'n_factors': 100, 'random_state': 0},
+    {'algorithm': 'svd', 'n_factors': 100, 'random_state': 1},
+    {'algorithm': 'svd', 'n_factors': 50, 'random_state': 2},
+    {'algorithm': 'svd', 'n_factors': 150, 'n_epochs': 30, 'random_state': 3},
+    {'algorithm': 'baseline', 'verbose': False},
+]
+RECOMMENDATION_VALIDATION_SIZE = 0.1
+RECOMMENDATION_TRAINING_WORKERS = int(os.environ.get("RECOMMENDATION_TRAINING_WORKERS", default=os.cpu_count()))
+# Log wall time and traced memory peak of every recommendation stage
+RECOMMENDATION_PROFILING = os.environ.get("RECOMMENDATION_PROFILING", default="0") == "1"
+# Also count live objects per stage, the census walks every tracked object and is slow on large heaps
+RECOMMENDATION_PROFILING_OBJECTS = os.environ.get("RECOMMENDATION_PROFILING_OBJECTS", default="0") == "1"
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'projects.recommendation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
 TIME_ZONE = 'Europe/Moscow'
@@ -7,6 +7,7 @@ For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 """
 
+import logging
 import os
 
 from django.core.wsgi import get_wsgi_application
@@ -14,3 +15,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'studentProjects.settings')
 
 application = get_wsgi_application()
+
+from projects.artifacts import warm_up_model  # noqa: E402
+
+try:
+    warm_up_model()
+except Exception:
+    # The model is loaded lazily on the first recommendation request instead
+    logging.getLogger('projects.recommendation').exception('Recommendation model warm-up failed')